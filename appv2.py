@@ -2,11 +2,15 @@
 # -*- coding: utf-8 -*-
 """
 考勤打卡统计程序 - 多组别版本
-支持教师组、行政组、后勤组不同规则
+考勤组及其规则由 attendance_rules.json 配置
 """
 
 import sys
 import os
+import time
+
+# 启动计时起点，用于 --startup-timing
+STARTUP_TIME = time.perf_counter()
 
 # 添加DLL路径修复
 if hasattr(sys, '_MEIPASS'):
@@ -14,22 +18,67 @@ if hasattr(sys, '_MEIPASS'):
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import re
+import threading
 import warnings
 
 warnings.filterwarnings('ignore')
 
-# 延迟导入pandas和numpy，避免DLL问题
-try:
-    import pandas as pd
-    import numpy as np
-except ImportError as e:
-    import tkinter.messagebox as msgbox
+from datetime import datetime
+
+import attendance_config
+import attendance_profiler
+from workbook_cache import WorkbookCache
+
+# pandas/numpy 和统计引擎导入较慢（打包为单文件后尤其明显），窗口显示后在后台线程加载，
+# 加载完成前这些名称为 None
+pd = None
+np = None
+attendance_engine = None
+_library_lock = threading.Lock()
+
+# 日志面板按固定间隔批量刷新，文本框只保留最近的行，完整日志写入滚动日志文件
+LOG_FLUSH_MS = 100
+LOG_MAX_LINES = 2000
+LOG_FILE = os.path.join(os.environ.get('LOCALAPPDATA') or os.path.expanduser('~'),
+                        '.attendance_checker', 'logs', 'attendance.log')
+LOG_FILE_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+# 开启 cProfile 时各任务的采集结果保存在这里
+PROFILE_DIR = os.path.join(os.path.dirname(LOG_FILE), 'profiles')
+
 
-    msgbox.showerror("错误", f"无法加载必要的库: {str(e)}\n请确保已安装pandas和numpy")
-    sys.exit(1)
+def load_libraries():
+    """
+    导入 pandas、numpy 和统计引擎，返回各自的导入耗时（秒）
 
-from datetime import datetime, timedelta
-from collections import defaultdict
+    可在任意线程调用，多个线程同时调用时只导入一次，已导入时返回空字典。
+    """
+    global pd, np, attendance_engine
+    with _library_lock:
+        if attendance_engine is not None:
+            return {}
+
+        timings = {}
+        started = time.perf_counter()
+        import numpy
+        timings['numpy'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        import pandas
+        timings['pandas'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        import attendance_engine as engine
+        timings['统计引擎'] = time.perf_counter() - started
+
+        np, pd, attendance_engine = numpy, pandas, engine
+        return timings
 
 
 class AttendanceChecker:
@@ -46,33 +95,26 @@ class AttendanceChecker:
         self.df = None
         self.file_path = None
         self.special_holidays = set()  # 存储特殊休息日
-        self.weekly_results = {}  # 存储每周统计结果
-
-        # 考勤组规则配置
-        self.group_rules = {
-            '教师组': {
-                'daily_punches': 2,  # 每天打卡次数
-                'weekly_punches': 10,  # 每周打卡次数
-                'punch_columns': ['上班1打卡时间', '上班1打卡结果', '下班1打卡时间', '下班1打卡结果'],
-                'description': '每天2次打卡（8:30前上班，16:30后下班）'
-            },
-            '行政组': {
-                'daily_punches': 4,  # 每天打卡次数
-                'weekly_punches': 20,  # 每周打卡次数
-                'punch_columns': ['上班1打卡时间', '上班1打卡结果', '下班1打卡时间', '下班1打卡结果',
-                                  '上班2打卡时间', '上班2打卡结果', '下班2打卡时间', '下班2打卡结果'],
-                'description': '每天4次打卡（8:00前、11:20后、13:40前、16:30后）'
-            },
-            '后勤组': {
-                'daily_punches': 4,  # 每天打卡次数
-                'weekly_punches': 20,  # 每周打卡次数
-                'punch_columns': ['上班1打卡时间', '上班1打卡结果', '下班1打卡时间', '下班1打卡结果',
-                                  '上班2打卡时间', '上班2打卡结果', '下班2打卡时间', '下班2打卡结果'],
-                'description': '每天4次打卡（8:00前、11:20后、13:40前、16:30后）'
-            }
-        }
+        self.results = None  # 周统计结果模型（attendance_engine.WeeklyResults）
+        self.analysis = None  # 可增量更新的统计状态，修改特殊休息日时使用
+        self.workbook_cache = WorkbookCache()  # 已解析文件的磁盘缓存
+
+        # 考勤组规则配置，统计引擎加载后编译判定
+        self.group_rules = attendance_config.load_group_rules()
 
-        self.current_group = '教师组'  # 默认选择教师组
+        self.current_group = next(iter(self.group_rules))  # 默认选择配置中的第一个考勤组
+
+        # 后台任务
+        self.task_queue = queue.Queue()  # 工作线程 -> 界面线程的消息队列
+        self.cancel_event = threading.Event()
+        self.task_thread = None
+        self.task_title = ''
+        self.task_started = 0.0
+        self.task_rows = None  # 任务处理的总行数（来自进度汇报）
+        self.profile_var = tk.BooleanVar(value=False)  # 后台任务是否用 cProfile 采集
+
+        # 启动耗时（秒）：导入各库为单独耗时，其余为从程序启动算起的时间
+        self.startup_timings = {}
 
         # 创建UI
         self.create_widgets()
@@ -96,24 +138,33 @@ class AttendanceChecker:
         ttk.Label(group_frame, text="选择考勤组:").grid(row=0, column=0, padx=5)
 
         self.group_var = tk.StringVar(value=self.current_group)
-        group_combo = ttk.Combobox(group_frame, textvariable=self.group_var,
-                                   values=list(self.group_rules.keys()),
-                                   state='readonly', width=15)
-        group_combo.grid(row=0, column=1, padx=5)
-        group_combo.bind('<<ComboboxSelected>>', self.on_group_change)
+        self.group_combo = ttk.Combobox(group_frame, textvariable=self.group_var,
+                                        values=list(self.group_rules.keys()) + [attendance_config.ALL_GROUPS],
+                                        state='readonly', width=15)
+        self.group_combo.grid(row=0, column=1, padx=5)
+        self.group_combo.bind('<<ComboboxSelected>>', self.on_group_change)
 
         self.group_desc_label = ttk.Label(group_frame,
-                                          text=self.group_rules[self.current_group]['description'],
+                                          text=self.group_description(self.current_group),
                                           foreground='blue')
         self.group_desc_label.grid(row=0, column=2, padx=20)
 
+        # 打卡判定方式：按导出的打卡结果，或按打卡时间和考勤组时限重新判定
+        ttk.Label(group_frame, text="判定方式:").grid(row=1, column=0, padx=5, pady=(5, 0))
+        self.punch_mode_var = tk.StringVar(value=attendance_config.EVALUATE_BY_RESULT)
+        mode_combo = ttk.Combobox(group_frame, textvariable=self.punch_mode_var,
+                                  values=attendance_config.PUNCH_MODES, state='readonly', width=15)
+        mode_combo.grid(row=1, column=1, padx=5, pady=(5, 0))
+        mode_combo.bind('<<ComboboxSelected>>', self.on_punch_mode_change)
+
         # 文件选择区域
         file_frame = ttk.LabelFrame(main_frame, text="文件操作", padding="10")
         file_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
 
         ttk.Button(file_frame, text="选择Excel文件", command=self.load_file).grid(row=0, column=0, padx=5)
+        ttk.Button(file_frame, text="批量选择", command=self.load_files).grid(row=0, column=1, padx=5)
         self.file_label = ttk.Label(file_frame, text="未选择文件")
-        self.file_label.grid(row=0, column=1, padx=5)
+        self.file_label.grid(row=0, column=2, padx=5)
 
         # 特殊日期设置区域
         holiday_frame = ttk.LabelFrame(main_frame, text="特殊休息日设置", padding="10")
@@ -137,14 +188,18 @@ class AttendanceChecker:
                    style='Accent.TButton').grid(row=0, column=0, padx=5)
         ttk.Button(control_frame, text="导出结果", command=self.export_results).grid(row=0, column=1, padx=5)
         ttk.Button(control_frame, text="清空日志", command=self.clear_log).grid(row=0, column=2, padx=5)
+        self.cancel_button = ttk.Button(control_frame, text="取消", command=self.cancel_task, state='disabled')
+        self.cancel_button.grid(row=0, column=3, padx=5)
 
         # 进度条
-        self.progress = ttk.Progressbar(control_frame, mode='indeterminate')
-        self.progress.grid(row=0, column=3, padx=5, sticky=(tk.W, tk.E))
+        self.progress = ttk.Progressbar(control_frame, mode='determinate', maximum=100)
+        self.progress.grid(row=0, column=4, padx=5, sticky=(tk.W, tk.E))
+        self.progress_label = ttk.Label(control_frame, text="")
+        self.progress_label.grid(row=0, column=5, padx=5)
 
         # 当前规则显示
         self.rule_label = ttk.Label(control_frame, text="", foreground='green')
-        self.rule_label.grid(row=1, column=0, columnspan=4, pady=5)
+        self.rule_label.grid(row=1, column=0, columnspan=6, pady=5)
 
         # 结果显示区域
         result_frame = ttk.LabelFrame(main_frame, text="统计结果", padding="10")
@@ -152,29 +207,19 @@ class AttendanceChecker:
         result_frame.rowconfigure(0, weight=1)
         result_frame.columnconfigure(0, weight=1)
 
-        # 创建树形视图显示结果
-        columns = ('姓名', '部门', '考勤组', '周期', '应打卡', '实际打卡', '正常次数', '迟到次数', '旷工次数', '周结果')
-        self.tree = ttk.Treeview(result_frame, columns=columns, show='headings', height=15)
+        # 创建虚拟化表格显示结果
+        columns = ('姓名', '部门', '考勤组', '周期', '应打卡', '实际打卡', '正常次数', '迟到次数', '旷工次数', '周结果',
+                   attendance_config.LATE_MINUTES_COLUMN)
 
         # 设置列标题和宽度
         column_widths = {
             '姓名': 100, '部门': 120, '考勤组': 80, '周期': 180,
             '应打卡': 70, '实际打卡': 70, '正常次数': 70,
-            '迟到次数': 70, '旷工次数': 70, '周结果': 100
+            '迟到次数': 70, '旷工次数': 70, '周结果': 100,
+            attendance_config.LATE_MINUTES_COLUMN: 90
         }
 
-        for col in columns:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=column_widths.get(col, 100))
-
-        # 添加滚动条
-        tree_scroll_y = ttk.Scrollbar(result_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        tree_scroll_x = ttk.Scrollbar(result_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
-        self.tree.configure(yscrollcommand=tree_scroll_y.set, xscrollcommand=tree_scroll_x.set)
-
-        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        tree_scroll_y.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        tree_scroll_x.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        self.result_view = VirtualTreeview(result_frame, columns, column_widths, height=15)
 
         # 日志显示区域
         log_frame = ttk.LabelFrame(main_frame, text="运行日志", padding="10")
@@ -184,6 +229,7 @@ class AttendanceChecker:
 
         self.log_text = scrolledtext.ScrolledText(log_frame, height=20, width=50, wrap=tk.WORD)
         self.log_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.log_panel = LogPanel(self.root, self.log_text)
 
         # 统计信息显示
         stats_frame = ttk.LabelFrame(main_frame, text="统计信息", padding="10")
@@ -192,28 +238,199 @@ class AttendanceChecker:
         self.stats_label = ttk.Label(stats_frame, text="等待数据加载...")
         self.stats_label.grid(row=0, column=0, padx=5)
 
+        # 数据处理组件（pandas/numpy 和统计引擎）的加载状态
+        self.library_label = ttk.Label(stats_frame, text="", foreground='gray')
+        self.library_label.grid(row=0, column=1, padx=20)
+        stats_frame.columnconfigure(0, weight=1)
+
     def on_group_change(self, event=None):
         """考勤组切换事件"""
         self.current_group = self.group_var.get()
-        self.group_desc_label.config(text=self.group_rules[self.current_group]['description'])
+        self.group_desc_label.config(text=self.group_description(self.current_group))
         self.log(f"已切换到: {self.current_group}")
+        self.analysis = None
 
         # 更新规则显示
-        rule = self.group_rules[self.current_group]
-        rule_text = f"当前规则: {self.current_group} - 每天{rule['daily_punches']}次, 每周{rule['weekly_punches']}次"
-        self.rule_label.config(text=rule_text)
+        self.rule_label.config(text=f"当前规则: {self.rule_text(self.current_group)}")
+
+    def on_punch_mode_change(self, event=None):
+        """判定方式切换事件"""
+        self.log(f"判定方式: 按{self.punch_mode_var.get()}")
+        self.analysis = None
+
+    def group_description(self, group):
+        """考勤组说明"""
+        if group == attendance_config.ALL_GROUPS:
+            default_group = next(iter(self.group_rules))
+            return f"一次统计所有考勤组（未识别考勤组的记录按{default_group}处理）"
+        return self.group_rules[group]['description']
+
+    def rule_text(self, group):
+        """考勤组打卡次数说明"""
+        if group == attendance_config.ALL_GROUPS:
+            groups = list(self.group_rules)
+        else:
+            groups = [group]
+        return "；".join(f"{name} - 每天{self.group_rules[name]['daily_punches']}次, "
+                        f"每周{self.group_rules[name]['weekly_punches']}次" for name in groups)
 
     def log(self, message, level='INFO'):
-        """写入日志"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_message = f"[{timestamp}] [{level}] {message}\n"
-        self.log_text.insert(tk.END, log_message)
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+        """写入日志（缓冲，由日志面板定时刷新到界面）"""
+        self.log_panel.write(message, level)
 
     def clear_log(self):
         """清空日志"""
-        self.log_text.delete(1.0, tk.END)
+        self.log_panel.clear()
+
+    def load_libraries_async(self, on_ready=None):
+        """窗口显示后在后台导入 pandas/numpy 和统计引擎，完成后调用 on_ready()"""
+        self.library_label.config(text="正在加载数据处理组件...", foreground='orange')
+        outcome = queue.Queue()
+
+        def worker():
+            try:
+                outcome.put(('done', load_libraries()))
+            except Exception as e:
+                outcome.put(('error', e))
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(50, self.poll_libraries, outcome, on_ready)
+
+    def poll_libraries(self, outcome, on_ready):
+        """检查后台导入是否完成"""
+        try:
+            kind, payload = outcome.get_nowait()
+        except queue.Empty:
+            self.root.after(50, self.poll_libraries, outcome, on_ready)
+            return
+
+        if kind == 'error':
+            self.library_label.config(text="数据处理组件加载失败", foreground='red')
+            self.log(f"无法加载必要的库: {str(payload)}", 'ERROR')
+            messagebox.showerror("错误", f"无法加载必要的库: {str(payload)}\n请确保已安装pandas和numpy")
+            return
+
+        self.group_rules = attendance_engine.compile_rules(self.group_rules)
+        self.startup_timings.update({f"导入{name}": seconds for name, seconds in payload.items()})
+        self.startup_timings['数据处理就绪'] = time.perf_counter() - STARTUP_TIME
+        self.library_label.config(text="数据处理组件已就绪", foreground='green')
+        self.log("启动耗时: " + " | ".join(f"{name} {seconds:.2f}秒"
+                                          for name, seconds in self.startup_timings.items()))
+        if on_ready is not None:
+            on_ready()
+
+    def run_task(self, title, work, on_success, on_error, on_cancel=None):
+        """
+        在后台线程执行耗时任务
+
+        work(progress) 在工作线程中运行，progress(已处理行数, 总行数) 用于汇报进度；
+        进度、日志和结果通过队列交给界面线程，由 poll_task_queue 定时处理。
+        任务取消时调用 on_cancel()。已有任务在运行时不启动新任务，返回 False。
+        """
+        if self.task_thread is not None and self.task_thread.is_alive():
+            messagebox.showwarning("警告", "已有任务正在运行，请等待完成或先取消！")
+            return False
+
+        self.cancel_event.clear()
+        self.task_title = title
+        self.task_started = time.perf_counter()
+        self.task_rows = None
+        self.progress.config(value=0)
+        if attendance_engine is None:
+            self.progress_label.config(text=f"{title}（等待数据处理组件加载）...")
+        else:
+            self.progress_label.config(text=f"{title}...")
+        self.cancel_button.config(state='normal')
+
+        def worker():
+            try:
+                # 第一次任务可能早于后台导入完成，在这里等待（或直接导入）
+                load_libraries()
+                profile_path = os.path.join(PROFILE_DIR, f"{title}_{datetime.now():%Y%m%d_%H%M%S}.prof")
+                with attendance_profiler.PROFILER.capture(profile_path) as capture, \
+                        attendance_profiler.phase(title) as step:
+                    result = work(self.report_progress)
+                    step.rows = self.task_rows
+                if capture:
+                    self.post_log(f"cProfile 结果已保存到: {capture['path']}\n{capture['top']}")
+                self.task_queue.put(('done', (on_success, result)))
+            except ImportError as e:
+                self.task_queue.put(('error', (on_error, e)))
+            except attendance_engine.AnalysisCancelled:
+                self.task_queue.put(('cancelled', on_cancel))
+            except Exception as e:
+                self.task_queue.put(('error', (on_error, e)))
+
+        self.task_thread = threading.Thread(target=worker, daemon=True)
+        self.task_thread.start()
+        self.root.after(100, self.poll_task_queue)
+        return True
+
+    def report_progress(self, done, total, unit='行'):
+        """工作线程汇报进度，已请求取消时中止任务"""
+        if self.cancel_event.is_set():
+            raise attendance_engine.AnalysisCancelled()
+        if unit == '行':
+            self.task_rows = total
+        self.task_queue.put(('progress', (done, total, unit)))
+
+    def post_log(self, message, level='INFO'):
+        """工作线程写日志"""
+        self.task_queue.put(('log', (message, level)))
+
+    def cancel_task(self):
+        """取消正在运行的任务"""
+        if self.task_thread is not None and self.task_thread.is_alive():
+            self.cancel_event.set()
+            self.log(f"正在取消: {self.task_title}", 'WARNING')
+
+    def poll_task_queue(self):
+        """处理工作线程发来的消息"""
+        try:
+            while True:
+                kind, payload = self.task_queue.get_nowait()
+                if kind == 'log':
+                    self.log(*payload)
+                elif kind == 'progress':
+                    self.show_progress(*payload)
+                elif kind == 'done':
+                    self.finish_task()
+                    on_success, result = payload
+                    on_success(result)
+                    return
+                elif kind == 'cancelled':
+                    self.finish_task()
+                    self.progress_label.config(text="已取消")
+                    self.log(f"{self.task_title}已取消", 'WARNING')
+                    if payload is not None:
+                        payload()
+                    return
+                elif kind == 'error':
+                    self.finish_task()
+                    on_error, error = payload
+                    on_error(error)
+                    return
+        except queue.Empty:
+            pass
+
+        self.root.after(100, self.poll_task_queue)
+
+    def show_progress(self, done, total, unit='行'):
+        """显示百分比、处理速度和预计剩余时间"""
+        percent = done / total * 100 if total else 100.0
+        elapsed = time.perf_counter() - self.task_started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (total - done) / rate if rate > 0 else 0.0
+        self.progress.config(value=percent)
+        self.progress_label.config(
+            text=f"{self.task_title} {percent:.0f}% | {rate:,.1f} {unit}/秒 | 剩余 {eta:.1f} 秒")
+
+    def finish_task(self):
+        """任务结束后恢复控件状态"""
+        self.cancel_button.config(state='disabled')
+        self.progress.config(value=100)
+        elapsed = time.perf_counter() - self.task_started
+        self.progress_label.config(text=f"{self.task_title}完成，用时 {elapsed:.1f} 秒")
 
     def load_file(self):
         """加载Excel文件"""
@@ -223,17 +440,42 @@ class AttendanceChecker:
         )
 
         if file_path:
-            try:
-                self.log(f"正在加载文件: {os.path.basename(file_path)}")
+            self.load_paths([file_path])
+
+    def load_files(self):
+        """批量加载多个Excel文件"""
+        file_paths = filedialog.askopenfilenames(
+            title="选择多个考勤Excel文件",
+            filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
+        )
+
+        if file_paths:
+            self.load_paths(list(file_paths))
+
+    def load_directory(self):
+        """加载文件夹中的所有Excel文件"""
+        directory = filedialog.askdirectory(title="选择考勤文件所在文件夹")
+
+        if directory:
+            self.load_paths([directory])
 
-                # 读取Excel文件，跳过前两行标题
-                self.df = pd.read_excel(file_path, skiprows=2, engine='openpyxl')
+    def load_paths(self, paths):
+        """加载一个或多个文件/文件夹，多个文件并行解析后合并"""
+        if paths:
+            names = ', '.join(os.path.basename(os.path.normpath(path)) for path in paths)
+            self.log(f"正在加载文件: {names}")
 
-                # 标准化列名
-                self.standardize_columns()
+            def work(progress):
+                return attendance_engine.load_attendance_files(paths, progress=progress,
+                                                               cache=self.workbook_cache,
+                                                               log=self.post_log,
+                                                               group_rules=self.group_rules)
 
-                self.file_path = file_path
-                self.file_label.config(text=os.path.basename(file_path))
+            def on_success(df):
+                self.df = df
+                self.analysis = None
+                self.file_path = paths[0] if len(paths) == 1 else None
+                self.file_label.config(text=names)
 
                 # 显示基本信息
                 self.log(f"文件加载成功！共 {len(self.df)} 条记录")
@@ -243,57 +485,162 @@ class AttendanceChecker:
 
                 # 显示日期范围
                 try:
-                    date_min = self.df['日期'].min()
-                    date_max = self.df['日期'].max()
-                    self.log(f"日期范围: {date_min} 至 {date_max}")
+                    dates = self.df[attendance_engine.DATE_COLUMN]
+                    self.log(f"日期范围: {dates.min():%Y-%m-%d} 至 {dates.max():%Y-%m-%d}")
                 except:
                     self.log("无法获取日期范围", 'WARNING')
 
                 # 更新统计信息
                 self.update_stats()
 
-            except Exception as e:
+            def on_error(e):
                 self.log(f"加载文件失败: {str(e)}", 'ERROR')
                 messagebox.showerror("错误", f"无法加载文件: {str(e)}")
 
-    def standardize_columns(self):
-        """标准化列名"""
-        # 基础列映射
-        base_columns = ["姓名", "考勤组", "部门", "主部门","工号", "职位", "UserId", "日期", "workDate", "班次"]
+            self.run_task("加载文件", work, on_success, on_error)
+
+    def append_file(self):
+        """把新的考勤导出追加到当前统计结果，只统计新记录"""
+        if self.analysis is None:
+            messagebox.showwarning("警告", "请先完成统计或打开统计状态！")
+            return
+
+        file_path = filedialog.askopenfilename(
+            title="选择要追加的考勤Excel文件",
+            filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+
+        analysis = self.analysis
+        current_df = self.df
+
+        def work(progress):
+            df = attendance_engine.load_attendance_file(file_path, progress=progress,
+                                                        cache=self.workbook_cache,
+                                                        log=self.post_log,
+                                                        group_rules=self.group_rules)
+            added, skipped = analysis.append(df)
+
+            fallback_group = attendance_engine.selected_groups(analysis.group_rules, analysis.group,
+                                                               analysis.default_group)[1]
+            diagnostics = attendance_engine.group_fallbacks(df, analysis.group_rules, fallback_group)
+            if current_df is not None:
+                df, _ = attendance_engine.drop_duplicate_punches([current_df, df])
+                df = attendance_engine.compact_frame(df)
+            return df, added, skipped, attendance_engine.WeeklyResults(analysis.weekly, analysis.group, diagnostics)
+
+        def on_success(outcome):
+            df, added, skipped, results = outcome
+            self.df = df
+            self.analysis = analysis
+            self.results = results
+            self.result_view.set_data(self.results.weekly)
+
+            self.log(f"追加完成！新增 {added} 条记录，跳过 {skipped} 条已导入的记录，"
+                     f"共 {len(self.results)} 条周统计记录")
+            self.update_stats()
+            self.update_final_stats()
 
-        # 教师组列（2次打卡）
-        teacher_columns = ["上班1打卡时间", "上班1打卡结果", "下班1打卡时间", "下班1打卡结果"]
+            # 追加期间修改过特殊休息日时增量补算
+            self.update_analysis()
 
-        # 行政/后勤组列（4次打卡）
-        admin_columns = ["上班1打卡时间", "上班1打卡结果", "下班1打卡时间", "下班1打卡结果",
-                         "上班2打卡时间", "上班2打卡结果", "下班2打卡时间", "下班2打卡结果"]
+        def on_error(e):
+            # 统计状态可能只追加了一部分，清除结果，需重新统计
+            self.results = None
+            self.result_view.clear()
+            self.stats_label.config(text="追加失败，统计结果已清除，请重新统计")
+            self.log(f"追加文件失败: {str(e)}，请重新统计", 'ERROR')
+            messagebox.showerror("错误", f"无法追加文件: {str(e)}")
 
-        # 检测是教师组还是行政/后勤组（根据列数）
-        if len(self.df.columns) > len(base_columns) + len(teacher_columns):
-            # 行政/后勤组格式
-            expected_columns = base_columns + admin_columns
-        else:
-            # 教师组格式
-            expected_columns = base_columns + teacher_columns
+        def on_cancel():
+            # 取消时尚未修改统计状态（只在加载文件时响应取消），恢复后补算期间修改的特殊休息日
+            self.analysis = analysis
+            self.update_analysis()
+
+        if not self.run_task("追加文件", work, on_success, on_error, on_cancel):
+            return
+
+        # 追加期间不再响应特殊休息日的增量更新
+        self.log(f"正在追加文件: {os.path.basename(file_path)}")
+        self.analysis = None
+
+    def open_state(self):
+        """打开保存的统计状态"""
+        file_path = filedialog.askopenfilename(
+            title="选择统计状态文件",
+            filetypes=[("统计状态", "*.pkl"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+
+        def work(progress):
+            return attendance_engine.IncrementalAnalysis.load(file_path)
+
+        def on_success(analysis):
+            self.analysis = analysis
+            self.df = None
+            self.file_label.config(text=f"统计状态: {os.path.basename(file_path)}")
+
+            # 恢复统计时使用的考勤组和特殊休息日
+            self.current_group = analysis.group
+            self.group_var.set(analysis.group)
+            self.punch_mode_var.set(analysis.punch_mode)
+            self.group_desc_label.config(text=self.group_description(analysis.group))
+            self.rule_label.config(text=f"当前规则: {self.rule_text(analysis.group)}")
+            self.special_holidays = set(pd.to_datetime(analysis.holidays).strftime('%Y-%m-%d'))
+            self.update_holiday_display()
+
+            self.results = attendance_engine.WeeklyResults(analysis.weekly, analysis.group)
+            self.result_view.set_data(self.results.weekly)
+            self.log(f"已打开统计状态: {os.path.basename(file_path)}，共 {len(analysis.record_days)} 条记录，"
+                     f"{len(self.results)} 条周统计记录")
+            self.update_final_stats()
+
+        def on_error(e):
+            self.log(f"打开统计状态失败: {str(e)}", 'ERROR')
+            messagebox.showerror("错误", f"无法打开统计状态: {str(e)}")
+
+        self.run_task("打开统计状态", work, on_success, on_error)
+
+    def save_state(self):
+        """保存统计状态，供之后追加新的考勤文件"""
+        if self.analysis is None:
+            messagebox.showwarning("警告", "没有可保存的统计状态！")
+            return
+
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".pkl",
+            initialfile=f"考勤统计状态_{self.analysis.group}",
+            filetypes=[("统计状态", "*.pkl"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
 
-        # 重命名列
-        if len(self.df.columns) >= len(expected_columns):
-            column_mapping = {self.df.columns[i]: expected_columns[i]
-                              for i in range(len(expected_columns))}
-            self.df.rename(columns=column_mapping, inplace=True)
-            self.log(f"已标准化 {len(expected_columns)} 个列名")
+        try:
+            self.analysis.save(file_path)
+            self.log(f"统计状态已保存到: {os.path.basename(file_path)}")
+        except Exception as e:
+            self.log(f"保存统计状态失败: {str(e)}", 'ERROR')
+            messagebox.showerror("错误", f"保存失败: {str(e)}")
 
     def detect_attendance_groups(self):
         """检测文件中的考勤组"""
         try:
             if '考勤组' in self.df.columns:
                 groups = self.df['考勤组'].dropna().unique()
-                self.log(f"检测到考勤组: {', '.join(groups)}")
-
-                # 统计各组人数
-                group_counts = self.df.groupby('考勤组')['姓名'].nunique()
-                for group, count in group_counts.items():
-                    self.log(f"  {group}: {count} 人")
+                self.log(f"检测到考勤组: {', '.join(map(str, groups))}")
+
+            # 按解析后的考勤组统计人数
+            resolved = self.df[attendance_engine.GROUP_COLUMN]
+            group_counts = self.df.groupby(resolved, observed=False)['姓名'].nunique()
+            for group, count in group_counts.items():
+                self.log(f"  {group}: {count} 人")
+
+            unresolved = resolved.isna()
+            if unresolved.any():
+                count = self.df.loc[unresolved, '姓名'].nunique()
+                self.log(f"  未识别考勤组: {count} 人（统计时按所选考勤组处理）", 'WARNING')
         except Exception as e:
             self.log(f"检测考勤组失败: {str(e)}", 'WARNING')
 
@@ -302,12 +649,13 @@ class AttendanceChecker:
         date_str = self.holiday_entry.get().strip()
         if date_str:
             try:
-                # 验证日期格式
-                datetime.strptime(date_str, '%Y-%m-%d')
+                # 验证日期格式，统一保存为 YYYY-MM-DD
+                date_str = datetime.strptime(date_str, '%Y-%m-%d').strftime('%Y-%m-%d')
                 self.special_holidays.add(date_str)
                 self.holiday_entry.delete(0, tk.END)
                 self.update_holiday_display()
                 self.log(f"添加特殊休息日: {date_str}")
+                self.update_analysis()
             except ValueError:
                 messagebox.showerror("错误", "日期格式错误！请使用 YYYY-MM-DD 格式")
 
@@ -316,182 +664,112 @@ class AttendanceChecker:
         self.special_holidays.clear()
         self.update_holiday_display()
         self.log("已清空所有特殊休息日")
+        self.update_analysis()
 
-    def update_holiday_display(self):
-        """更新特殊休息日显示"""
-        if self.special_holidays:
-            holidays_text = "已设置的特殊休息日：" + ", ".join(sorted(self.special_holidays))
-        else:
-            holidays_text = "已设置的特殊休息日：无"
-        self.holiday_list_label.config(text=holidays_text)
+    def update_analysis(self):
+        """特殊休息日变化后增量更新已有的统计结果"""
+        if self.analysis is None:
+            return
+        try:
+            start = time.perf_counter()
+            with attendance_profiler.phase('特殊休息日更新', len(self.analysis.record_days)):
+                rows = self.analysis.update(self.special_holidays)
+            if len(rows) == 0:
+                return
+            self.results.patch(rows, self.analysis.weekly)
+            self.result_view.refresh()
+            self.update_final_stats()
+            self.log(f"已按新的特殊休息日更新 {len(rows)} 条周统计记录，耗时 {time.perf_counter() - start:.2f}秒")
+        except Exception as e:
+            self.analysis = None
+            self.log(f"更新统计结果失败: {str(e)}，请重新统计", 'ERROR')
+
+    def reload_rules(self):
+        """重新读取考勤组规则配置"""
+        # 后台任务读取当前的规则和 self.df 的考勤组列，运行期间不替换
+        if self.task_thread is not None and self.task_thread.is_alive():
+            messagebox.showwarning("警告", "任务正在运行，请等待完成或先取消后再重新加载考勤规则！")
+            return
 
-    def parse_date(self, date_str):
-        """解析日期字符串"""
-        if pd.isna(date_str):
-            return None
+        try:
+            group_rules = attendance_config.load_group_rules()
+            if attendance_engine is not None:
+                group_rules = attendance_engine.compile_rules(group_rules)
+        except Exception as e:
+            self.log(f"读取考勤组规则失败: {str(e)}", 'ERROR')
+            messagebox.showerror("错误", f"无法读取考勤组规则: {str(e)}")
+            return
 
-        # 处理各种日期格式
-        date_str = str(date_str).strip()
+        self.group_rules = group_rules
+        self.analysis = None
+        self.group_combo.config(values=list(self.group_rules.keys()) + [attendance_config.ALL_GROUPS])
+        if self.current_group not in self.group_rules and self.current_group != attendance_config.ALL_GROUPS:
+            self.group_var.set(next(iter(self.group_rules)))
+        self.on_group_change()
+        self.log(f"已重新加载考勤组规则: {', '.join(self.group_rules)}")
 
-        # 尝试从 "25-09-08 星期一" 格式中提取日期
-        if '星期' in date_str:
-            date_part = date_str.split()[0]
-            parts = date_part.split('-')
-            if len(parts) == 3:
-                year = '20' + parts[0] if len(parts[0]) == 2 else parts[0]
-                return f"{year}-{parts[1].zfill(2)}-{parts[2].zfill(2)}"
+        # 按新规则重新解析已加载数据的考勤组
+        if self.df is not None:
+            attendance_engine.resolve_groups(self.df, self.group_rules)
+            self.detect_attendance_groups()
+            self.update_stats()
 
-        # 尝试其他格式
-        for fmt in ['%Y-%m-%d', '%y-%m-%d', '%Y/%m/%d', '%y/%m/%d']:
-            try:
-                dt = datetime.strptime(date_str.split()[0], fmt)
-                return dt.strftime('%Y-%m-%d')
-            except:
-                continue
+    def clear_cache(self):
+        """清空文件解析缓存"""
+        try:
+            freed = self.workbook_cache.clear()
+            self.log(f"已清空文件缓存，释放 {freed / 1024 / 1024:.1f} MB")
+        except Exception as e:
+            self.log(f"清空文件缓存失败: {str(e)}", 'ERROR')
 
-        return None
+    def show_group_diagnostics(self):
+        """显示考勤组诊断表"""
+        if self.results is None or self.results.diagnostics.empty:
+            messagebox.showinfo("考勤组诊断", "没有未识别考勤组的记录")
+            return
+        GroupDiagnosticsDialog(self.root, self.results.diagnostics)
+
+    def show_performance(self):
+        """显示性能记录"""
+        PerformanceDialog(self.root, attendance_profiler.PROFILER, self.export_performance)
+
+    def export_performance(self):
+        """把性能记录导出为 JSON"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            initialfile=f"性能记录_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
 
-    def get_week_key(self, date_str):
-        """获取周标识（周一到周五）"""
         try:
-            dt = datetime.strptime(date_str, '%Y-%m-%d')
-            # 获取该日期所在周的周一
-            monday = dt - timedelta(days=dt.weekday())
-            friday = monday + timedelta(days=4)
-            return f"{monday.strftime('%Y-%m-%d')} 至 {friday.strftime('%Y-%m-%d')}"
-        except:
-            return None
-
-    def get_attendance_group(self, row):
-        """获取员工的考勤组"""
-        # 优先从考勤组列获取
-        if '考勤组' in row and pd.notna(row['考勤组']):
-            group = str(row['考勤组']).strip()
-            # 匹配到已知的组
-            for known_group in self.group_rules.keys():
-                if known_group in group:
-                    return known_group
-
-        # 如果没有考勤组信息，返回当前选择的组
-        return self.current_group
-
-    def analyze_attendance(self, row, group_type):
-        """分析单条考勤记录"""
-        result = {
-            'is_normal': False,
-            'is_late': False,
-            'is_absent': False,
-            'normal_count': 0,
-            'late_count': 0,
-            'absent_count': 0,
-            'total_punches': 0,
-            'details': []
-        }
+            attendance_profiler.PROFILER.save_json(file_path)
+            self.log(f"性能记录已导出到: {os.path.basename(file_path)}")
+        except Exception as e:
+            self.log(f"导出性能记录失败: {str(e)}", 'ERROR')
+            messagebox.showerror("错误", f"导出失败: {str(e)}")
 
-        # 获取日期
-        date_str = self.parse_date(row.get('日期', ''))
+    def clear_performance(self):
+        """清空性能记录"""
+        attendance_profiler.PROFILER.clear()
+        self.log("已清空性能记录")
 
-        # 检查是否是特殊休息日
-        if date_str in self.special_holidays:
-            rule = self.group_rules[group_type]
-            result['is_normal'] = True
-            result['normal_count'] = rule['daily_punches']
-            result['total_punches'] = rule['daily_punches']
-            result['details'].append("特殊休息日")
-            return result
+    def on_profile_toggle(self):
+        """切换后台任务的 cProfile 采集"""
+        attendance_profiler.PROFILER.profile_enabled = self.profile_var.get()
+        if self.profile_var.get():
+            self.log(f"已开启 cProfile，之后的后台任务结果保存到: {PROFILE_DIR}")
+        else:
+            self.log("已关闭 cProfile")
 
-        # 检查是否是周末
-        if date_str:
-            try:
-                dt = datetime.strptime(date_str, '%Y-%m-%d')
-                if dt.weekday() >= 5:  # 周六或周日
-                    rule = self.group_rules[group_type]
-                    result['is_normal'] = True
-                    result['normal_count'] = rule['daily_punches']
-                    result['total_punches'] = rule['daily_punches']
-                    result['details'].append("周末")
-                    return result
-            except:
-                pass
-
-        # 获取该组的打卡规则
-        rule = self.group_rules[group_type]
-
-        # 分析每次打卡
-        punch_results = []
-
-        if group_type == '教师组':
-            # 教师组：2次打卡
-            morning_result = self.check_punch_status(row.get('上班1打卡结果', ''))
-            evening_result = self.check_punch_status(row.get('下班1打卡结果', ''))
-            punch_results = [morning_result, evening_result]
-
-        else:  # 行政组或后勤组
-            # 行政/后勤组：4次打卡
-            morning1_result = self.check_punch_status(row.get('上班1打卡结果', ''))
-            noon1_result = self.check_punch_status(row.get('下班1打卡结果', ''))
-            afternoon1_result = self.check_punch_status(row.get('上班2打卡结果', ''))
-            evening1_result = self.check_punch_status(row.get('下班2打卡结果', ''))
-            punch_results = [morning1_result, noon1_result, afternoon1_result, evening1_result]
-
-        # 统计各类打卡情况
-        for punch in punch_results:
-            if punch in ['正常', '补卡', '请假']:
-                result['normal_count'] += 1
-            elif punch == '严重迟到':
-                # 严重迟到特殊处理
-                pass
-            # elif punch == '缺卡':
-            #     result['absent_count'] = 1
-        if '缺卡' in punch_results[:2]:
-            result['absent_count'] += 1
-        if '缺卡' in punch_results[2:]:
-            result['absent_count'] += 1
-
-        result['total_punches'] = len(punch_results)
-
-        # 判断当天状态
-        if '缺卡' in punch_results:
-            result['is_absent'] = True
-            result['details'].append("旷工")
-        elif '严重迟到' in punch_results:
-            # 严重迟到+正常 = 迟到
-            late_count = punch_results.count('严重迟到')
-            normal_count = punch_results.count('正常')
-            if late_count > 0 and normal_count > 0:
-                result['is_late'] = True
-                result['late_count'] = 1
-                result['normal_count'] += 1  # 严重迟到算作一次正常
-                result['details'].append("迟到")
-        elif all(p in ['正常', '补卡', '请假'] for p in punch_results):
-            result['is_normal'] = True
-            result['details'].append("正常")
-
-        return result
-
-    def check_punch_status(self, status):
-        """检查打卡状态"""
-        if pd.isna(status) or status == '' or status == '未打卡':
-            return '缺卡'
-
-        status = str(status).strip().lower()
-
-        # 包含"正常"字的都视为正常（适用于行政/后勤组规则）
-        if '正常' in status or ('管理员' in status and '改为正常' in status):
-            return '正常'
-        elif '补卡' in status:
-            return '补卡'
-        elif '请假' in status:
-            return '请假'
-        elif '严重迟到' in status:
-            return '严重迟到'
-        elif '缺卡' in status:
-            return '缺卡'
+    def update_holiday_display(self):
+        """更新特殊休息日显示"""
+        if self.special_holidays:
+            holidays_text = "已设置的特殊休息日：" + ", ".join(sorted(self.special_holidays))
         else:
-            # 对于行政/后勤组，包含"正常"字的都视为正常
-            if self.current_group in ['行政组', '后勤组'] and '正常' in status:
-                return '正常'
-            return status
+            holidays_text = "已设置的特殊休息日：无"
+        self.holiday_list_label.config(text=holidays_text)
 
     def start_analysis(self):
         """开始统计分析"""
@@ -499,144 +777,63 @@ class AttendanceChecker:
             messagebox.showwarning("警告", "请先加载Excel文件！")
             return
 
-        try:
-            self.log(f"开始统计分析 - 当前选择: {self.current_group}")
-            self.progress.start()
-
-            # 显示当前规则
-            rule = self.group_rules[self.current_group]
-            rule_text = f"执行规则: {self.current_group} - 每天{rule['daily_punches']}次, 每周{rule['weekly_punches']}次"
-            self.rule_label.config(text=rule_text)
-
-            # 清空之前的结果
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-
-            # 按员工和周分组统计
-            employee_weekly_stats = defaultdict(lambda: defaultdict(lambda: {
-                'normal_count': 0,
-                'late_count': 0,
-                'absent_count': 0,
-                'total_punches': 0,
-                'expected_punches': 0,
-                'days': [],
-                'department': '',
-                'name': '',
-                'group': ''
-            }))
-
-            total_rows = len(self.df)
-            processed = 0
-            error_count = 0
-
-            for idx, row in self.df.iterrows():
-                processed += 1
-                if processed % 100 == 0:
-                    self.log(f"处理进度: {processed}/{total_rows}")
-
-                try:
-                    name = row.get('姓名', '')
-                    department = row.get('部门', '')
-                    date_str = self.parse_date(row.get('日期', ''))
-
-                    if not date_str or pd.isna(name) or name == '姓名':
-                        continue
-
-                    # 获取员工的考勤组
-                    group_type = self.get_attendance_group(row)
-
-                    # 只统计当前选择的考勤组
-                    if group_type != self.current_group:
-                        continue
-
-                    week_key = self.get_week_key(date_str)
-                    if not week_key:
-                        continue
-
-                    # 分析考勤
-                    analysis = self.analyze_attendance(row, group_type)
-
-                    # 更新统计
-                    stats = employee_weekly_stats[name][week_key]
-                    stats['name'] = name
-                    stats['department'] = department
-                    stats['group'] = group_type
-                    stats['days'].append(date_str)
-
-                    # 累加统计
-                    stats['total_punches'] += analysis['total_punches']
-                    stats['normal_count'] += analysis['normal_count']
-                    stats['late_count'] += analysis['late_count']
-                    stats['absent_count'] += analysis['absent_count']
-
-                except Exception as e:
-                    error_count += 1
-                    self.log(f"处理第 {idx + 1} 行时出错: {str(e)}", 'ERROR')
-                    continue
-
-            # 生成最终结果
+        # 工作线程使用的参数快照
+        df = self.df
+        group = self.current_group
+        group_rules = self.group_rules
+        holidays = set(self.special_holidays)
+        punch_mode = self.punch_mode_var.get()
+        previous, previous_rule = self.analysis, self.rule_label.cget('text')
+
+        def work(progress):
+            # 按员工和周分组统计（列运算）
+            self.post_log(f"共 {len(df)} 条记录，正在分析...")
+            analysis = attendance_engine.IncrementalAnalysis(df, group_rules, group, holidays,
+                                                             progress=progress, punch_mode=punch_mode)
+
+            # 未识别考勤组的记录
+            fallback_group = attendance_engine.selected_groups(group_rules, group)[1]
+            diagnostics = attendance_engine.group_fallbacks(df, group_rules, fallback_group)
+            return analysis, attendance_engine.WeeklyResults(analysis.weekly, group, diagnostics)
+
+        def on_success(outcome):
+            # 替换之前的结果，表格只显示可见部分
             self.log("生成统计结果...")
-            result_count = 0
-
-            for name, weekly_data in employee_weekly_stats.items():
-                for week_key, stats in weekly_data.items():
-                    # 获取该组的规则
-                    group_rule = self.group_rules[stats['group']]
-                    expected_weekly = group_rule['weekly_punches']
-
-                    # 计算周结果
-                    week_result = self.calculate_week_result(stats, group_rule)
-
-                    # 添加到树形视图
-                    self.tree.insert('', 'end', values=(
-                        name,
-                        stats['department'],
-                        stats['group'],
-                        week_key,
-                        expected_weekly,
-                        stats['total_punches'],
-                        stats['normal_count'],
-                        stats['late_count'],
-                        stats['absent_count'],
-                        week_result
-                    ))
-                    result_count += 1
-
-            self.progress.stop()
-
-            if error_count > 0:
-                self.log(f"统计完成！共生成 {result_count} 条周统计记录，出错 {error_count} 条", 'WARNING')
-            else:
-                self.log(f"统计完成！共生成 {result_count} 条周统计记录")
+            self.analysis, results = outcome
+            self.results = results
+            self.result_view.set_data(self.results.weekly)
+
+            self.log(f"统计完成！共生成 {len(self.results)} 条周统计记录")
+            if not results.diagnostics.empty:
+                fallback_group = results.diagnostics['归入考勤组'].iloc[0]
+                self.log(f"有 {results.diagnostics['记录数'].sum()} 条记录未识别考勤组，已按{fallback_group}统计"
+                         f"（详见 工具 > 考勤组诊断）", 'WARNING')
 
             # 更新统计信息
             self.update_final_stats()
 
-        except Exception as e:
-            self.progress.stop()
+            # 统计期间修改过特殊休息日时增量补算
+            self.update_analysis()
+
+        def restore():
+            # 保留之前的统计结果和状态
+            self.analysis = previous
+            self.rule_label.config(text=previous_rule)
+            self.update_analysis()
+
+        def on_error(e):
+            restore()
             self.log(f"统计过程出错: {str(e)}", 'ERROR')
             messagebox.showerror("错误", f"统计失败: {str(e)}")
 
-    def calculate_week_result(self, stats, group_rule):
-        """计算周结果"""
-        expected_weekly = group_rule['weekly_punches']
-
-        # 如果打卡次数少于预期，缺失的视为正常
-        if stats['total_punches'] < expected_weekly:
-            missing_punches = expected_weekly - stats['total_punches']
-            stats['normal_count'] += missing_punches
-            stats['total_punches'] = expected_weekly
-
-        # 判断周结果
-        if stats['normal_count'] >= expected_weekly:
-            return "正常"
-        elif stats['absent_count'] > 0:
-            return f"旷工{stats['absent_count']}次"
-        elif stats['late_count'] > 0:
-            return f"迟到{stats['late_count']}次"
-        else:
-            abnormal = expected_weekly - stats['normal_count']
-            return f"异常{abnormal}次"
+        if not self.run_task("统计分析", work, on_success, on_error, restore):
+            return
+
+        self.log(f"开始统计分析 - 当前选择: {group}，判定方式: 按{punch_mode}")
+
+        # 显示当前规则
+        self.rule_label.config(text=f"执行规则: {self.rule_text(group)}")
+        self.analysis = None  # 统计期间修改的特殊休息日在完成后补算
 
     def update_stats(self):
         """更新基本统计信息"""
@@ -646,14 +843,12 @@ class AttendanceChecker:
                 total_records = len(self.df)
 
                 # 统计各考勤组人数
-                group_info = ""
-                if '考勤组' in self.df.columns:
-                    group_counts = self.df.groupby('考勤组')['姓名'].nunique()
-                    group_info = " | ".join([f"{g}:{c}人" for g, c in group_counts.items()])
+                resolved = self.df[attendance_engine.GROUP_COLUMN]
+                group_counts = self.df.groupby(resolved, observed=False)['姓名'].nunique()
+                group_info = " | ".join([f"{g}:{c}人" for g, c in group_counts.items()])
 
-                date_min = str(self.df['日期'].min())
-                date_max = str(self.df['日期'].max())
-                date_range = f"{date_min} 至 {date_max}"
+                dates = self.df[attendance_engine.DATE_COLUMN]
+                date_range = f"{dates.min():%Y-%m-%d} 至 {dates.max():%Y-%m-%d}"
 
                 stats_text = f"员工数: {unique_employees} | 记录数: {total_records} | {group_info} | 日期: {date_range}"
                 self.stats_label.config(text=stats_text)
@@ -662,21 +857,14 @@ class AttendanceChecker:
 
     def update_final_stats(self):
         """更新最终统计信息"""
-        if self.tree.get_children():
-            total = len(self.tree.get_children())
-            normal = sum(1 for child in self.tree.get_children()
-                         if self.tree.item(child)['values'][9] == '正常')
-            abnormal = total - normal
-
-            # 统计迟到和旷工
-            late = sum(1 for child in self.tree.get_children()
-                       if '迟到' in str(self.tree.item(child)['values'][9]))
-            absent = sum(1 for child in self.tree.get_children()
-                         if '旷工' in str(self.tree.item(child)['values'][9]))
+        if self.results is not None and not self.results.empty:
+            counts = self.results.counts()
+            total = counts['total']
+            normal = counts['normal']
 
             if total > 0:
-                stats_text = (f"{self.current_group} 周统计: 总数{total} | "
-                              f"正常{normal} | 迟到{late} | 旷工{absent} | "
+                stats_text = (f"{self.results.group} 周统计: 总数{total} | "
+                              f"正常{normal} | 迟到{counts['late']} | 旷工{counts['absent']} | "
                               f"正常率{normal / total * 100:.1f}%")
             else:
                 stats_text = "暂无统计数据"
@@ -684,88 +872,341 @@ class AttendanceChecker:
 
     def export_results(self):
         """导出统计结果"""
-        if not self.tree.get_children():
+        if self.results is None or self.results.empty:
             messagebox.showwarning("警告", "没有可导出的数据！")
             return
 
-        try:
-            # 选择保存位置
-            default_name = f"考勤统计_{self.current_group}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".xlsx",
-                initialfile=default_name,
-                filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("All files", "*.*")]
-            )
-
-            if file_path:
-                # 收集数据
-                data = []
-                for child in self.tree.get_children():
-                    values = self.tree.item(child)['values']
-                    data.append(values)
-
-                # 创建DataFrame
-                columns = ['姓名', '部门', '考勤组', '周期', '应打卡', '实际打卡',
-                           '正常次数', '迟到次数', '旷工次数', '周结果']
-                result_df = pd.DataFrame(data, columns=columns)
-
-                # 添加汇总统计
-                summary_data = []
-
-                # 统计每个人的总体情况
-                for name in result_df['姓名'].unique():
-                    person_data = result_df[result_df['姓名'] == name]
-                    total_weeks = len(person_data)
-                    normal_weeks = sum(person_data['周结果'] == '正常')
-                    late_weeks = sum(person_data['周结果'].str.contains('迟到', na=False))
-                    absent_weeks = sum(person_data['周结果'].str.contains('旷工', na=False))
-
-                    summary_data.append({
-                        '姓名': name,
-                        '部门': person_data['部门'].iloc[0],
-                        '考勤组': person_data['考勤组'].iloc[0],
-                        '统计周数': total_weeks,
-                        '正常周数': normal_weeks,
-                        '迟到周数': late_weeks,
-                        '旷工周数': absent_weeks,
-                        '正常率': f"{normal_weeks / total_weeks * 100:.1f}%" if total_weeks > 0 else "0%"
-                    })
-
-                summary_df = pd.DataFrame(summary_data)
-
-                # 根据文件扩展名保存
-                if file_path.endswith('.csv'):
-                    result_df.to_csv(file_path, index=False, encoding='utf-8-sig')
-                    # CSV保存汇总到另一个文件
-                    summary_path = file_path.replace('.csv', '_汇总.csv')
-                    summary_df.to_csv(summary_path, index=False, encoding='utf-8-sig')
-                    self.log(f"汇总已导出到: {os.path.basename(summary_path)}")
-                else:
-                    with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                        result_df.to_excel(writer, sheet_name='周统计明细', index=False)
-                        summary_df.to_excel(writer, sheet_name='个人汇总', index=False)
-
-                        # 添加规则说明
-                        rules_df = pd.DataFrame([
-                            ['考勤组', '每天打卡次数', '每周打卡次数', '规则说明'],
-                            ['教师组', '2', '10', '每天2次打卡（8:30前上班，16:30后下班）'],
-                            ['行政组', '4', '20', '每天4次打卡（8:00前、11:20后、13:40前、16:30后）'],
-                            ['后勤组', '4', '20', '每天4次打卡（8:00前、11:20后、13:40前、16:30后）']
-                        ])
-                        rules_df.to_excel(writer, sheet_name='考勤规则', index=False, header=False)
-
-                self.log(f"结果已导出到: {os.path.basename(file_path)}")
-                messagebox.showinfo("成功", f"结果已成功导出到:\n{file_path}")
+        # 选择保存位置
+        default_name = f"考勤统计_{self.results.group}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".xlsx",
+            initialfile=default_name,
+            filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv"),
+                       ("Parquet files", "*.parquet"), ("Feather files", "*.feather"), ("All files", "*.*")]
+        )
 
-        except Exception as e:
+        if not file_path:
+            return
+
+        results = self.results
+
+        # 列式格式可另存逐日明细（需要当前的统计状态）
+        daily = None
+        if (os.path.splitext(file_path)[1].lower() in attendance_engine.COLUMNAR_FORMATS
+                and self.analysis is not None
+                and messagebox.askyesno("逐日明细", "是否同时导出逐日明细？")):
+            daily = self.analysis.daily_frame()
+
+        def work(progress):
+            return attendance_engine.write_results(results, file_path, progress=progress,
+                                                   log=self.post_log, group_rules=self.group_rules,
+                                                   daily=daily)
+
+        def on_success(file_path):
+            self.log(f"结果已导出到: {os.path.basename(file_path)}")
+            messagebox.showinfo("成功", f"结果已成功导出到:\n{file_path}")
+
+        def on_error(e):
             self.log(f"导出失败: {str(e)}", 'ERROR')
             messagebox.showerror("错误", f"导出失败: {str(e)}")
 
+        self.run_task("导出结果", work, on_success, on_error)
+
+
+class LogPanel:
+    """
+    缓冲的日志面板
+
+    write() 只把消息放入缓冲区，界面线程每 LOG_FLUSH_MS 毫秒最多刷新一次，批量写入文本框；
+    文本框只保留最近 max_lines 行，完整日志逐条写入滚动日志文件。
+    连续的相同消息合并为一行并显示次数，警告和错误比较时忽略其中的数字（如行号）。
+    """
+
+    TAIL_MARK = 'log_tail'  # 文本框中最后一条消息的起始位置
+
+    def __init__(self, root, text, max_lines=LOG_MAX_LINES, flush_ms=LOG_FLUSH_MS, log_file=LOG_FILE):
+        self.root = root
+        self.text = text
+        self.max_lines = max_lines
+        self.flush_ms = flush_ms
+        self.pending = []  # 等待刷新的消息 [文本, 次数]
+        self.last = None  # 最后一条消息 [文本, 次数]，可能已经显示
+        self.last_key = None
+        self.shown = None  # 文本框最后一行对应的消息及显示时的次数
+        self.shown_count = 0
+        self.flush_scheduled = False
+        self.file_logger = self.open_log_file(log_file) if log_file else None
+
+    @staticmethod
+    def open_log_file(log_file):
+        """打开滚动日志文件，无法写入时不记录到文件"""
+        try:
+            os.makedirs(os.path.dirname(log_file), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=LOG_FILE_BYTES,
+                                                           backupCount=LOG_FILE_BACKUPS, encoding='utf-8')
+        except OSError:
+            return None
+        handler.setFormatter(logging.Formatter('[%(asctime)s] [%(levelname)s] %(message)s', '%Y-%m-%d %H:%M:%S'))
+        logger = logging.getLogger('attendance_checker')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.handlers[:] = [handler]
+        return logger
+
+    def write(self, message, level='INFO'):
+        """添加一条日志（界面线程调用）"""
+        if self.file_logger is not None:
+            self.file_logger.log(getattr(logging, level, logging.INFO), message)
+
+        key = (level, re.sub(r'\d+', '#', message) if level in ('WARNING', 'ERROR') else message)
+        if key == self.last_key:
+            self.last[1] += 1
+        else:
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.last = [f"[{timestamp}] [{level}] {message}", 1]
+            self.last_key = key
+            self.pending.append(self.last)
+
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.root.after(self.flush_ms, self.flush)
+
+    @staticmethod
+    def render(entry):
+        text, count = entry
+        return f"{text}（共 {count} 次）\n" if count > 1 else f"{text}\n"
+
+    def flush(self):
+        """把缓冲的消息写入文本框，并裁剪到最近 max_lines 行"""
+        self.flush_scheduled = False
+        at_bottom = self.text.yview()[1] >= 0.999
+
+        # 已显示的最后一条消息又重复了，改写那一行的次数
+        if self.shown is not None and self.shown[1] != self.shown_count:
+            self.text.delete(self.TAIL_MARK, 'end-1c')
+            self.text.insert(tk.END, self.render(self.shown))
+            self.shown_count = self.shown[1]
+
+        if self.pending:
+            pending, self.pending = self.pending, []
+            if len(pending) > 1:
+                self.text.insert(tk.END, ''.join(self.render(entry) for entry in pending[:-1]))
+            self.text.mark_set(self.TAIL_MARK, 'end-1c')
+            self.text.mark_gravity(self.TAIL_MARK, tk.LEFT)
+            self.text.insert(tk.END, self.render(pending[-1]))
+            self.shown, self.shown_count = pending[-1], pending[-1][1]
+
+            lines = int(self.text.index('end-1c').split('.')[0]) - 1
+            if lines > self.max_lines:
+                self.text.delete('1.0', f'{lines - self.max_lines + 1}.0')
+
+        # 用户向上翻看时不跳到末尾
+        if at_bottom:
+            self.text.see(tk.END)
+
+    def clear(self):
+        """清空文本框和缓冲区（日志文件保留）"""
+        self.text.delete('1.0', tk.END)
+        self.pending = []
+        self.last = self.last_key = self.shown = None
+        self.shown_count = 0
+
+
+class VirtualTreeview:
+    """
+    虚拟化结果表格
+
+    完整结果保存在 DataFrame 中，Treeview 只保留可见的一屏行，
+    滚动时改写这些行的内容，不再为每条结果创建控件条目。
+    """
+
+    DEFAULT_ROW_HEIGHT = 20  # Treeview 默认行高（像素）
+    HEADER_HEIGHT = 25  # 表头高度（像素）
+
+    def __init__(self, parent, columns, column_widths, height=15):
+        self.columns = list(columns)
+        self.data = None  # 当前数据（DataFrame），None 表示没有数据
+        self.offset = 0  # 第一行可见数据在 data 中的位置
+        self.items = []  # 复用的 Treeview 行
+        self.visible_rows = 0
+
+        self.tree = ttk.Treeview(parent, columns=self.columns, show='headings', height=height)
+        for col in self.columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=column_widths.get(col, 100))
+
+        # 纵向滚动条直接控制数据偏移，横向滚动条交给 Treeview
+        self.scroll_y = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.on_scroll)
+        self.scroll_x = ttk.Scrollbar(parent, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(xscrollcommand=self.scroll_x.set)
+
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.scroll_y.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.scroll_x.grid(row=1, column=0, sticky=(tk.W, tk.E))
+
+        self.tree.bind('<Configure>', self.on_resize)
+        self.tree.bind('<MouseWheel>', self.on_mousewheel)
+        self.tree.bind('<Button-4>', lambda event: self.scroll_by(-3))
+        self.tree.bind('<Button-5>', lambda event: self.scroll_by(3))
+
+        self.resize_pool(height)
+        self.refresh()
+
+    def set_data(self, df):
+        """替换全部数据，耗时与结果行数无关"""
+        with attendance_profiler.phase('填充表格', 0 if df is None else len(df)):
+            self.data = df
+            self.offset = 0
+            self.refresh()
+
+    def clear(self):
+        """清空数据"""
+        self.set_data(None)
+
+    def row_count(self):
+        return 0 if self.data is None else len(self.data)
+
+    def max_offset(self):
+        return max(0, self.row_count() - self.visible_rows)
+
+    def scroll_to(self, offset):
+        offset = min(max(0, int(offset)), self.max_offset())
+        if offset != self.offset:
+            self.offset = offset
+            self.refresh()
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.offset + rows)
+
+    def on_scroll(self, *args):
+        """纵向滚动条回调：moveto 比例 或 scroll 行数/页数"""
+        if args[0] == 'moveto':
+            self.scroll_to(round(float(args[1]) * self.row_count()))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            if args[2] == 'pages':
+                step *= self.visible_rows
+            self.scroll_by(step)
+
+    def on_mousewheel(self, event):
+        self.scroll_by(-3 if event.delta > 0 else 3)
+        return 'break'
+
+    def on_resize(self, event):
+        """窗口大小变化时调整可见行数"""
+        row_height = ttk.Style().lookup('Treeview', 'rowheight') or self.DEFAULT_ROW_HEIGHT
+        rows = max(1, (event.height - self.HEADER_HEIGHT) // int(row_height))
+        if rows != self.visible_rows:
+            self.resize_pool(rows)
+            self.offset = min(self.offset, self.max_offset())
+            self.refresh()
+
+    def resize_pool(self, rows):
+        """让 Treeview 中的行数等于可见行数"""
+        while len(self.items) < rows:
+            self.items.append(self.tree.insert('', 'end', values=()))
+        while len(self.items) > rows:
+            self.tree.delete(self.items.pop())
+        self.visible_rows = rows
+
+    def refresh(self):
+        """把当前窗口内的数据写入 Treeview 行，数据中没有的列显示为空"""
+        window = []
+        if self.data is not None:
+            window = self.data.iloc[self.offset:self.offset + self.visible_rows]
+            window = list(window.reindex(columns=self.columns, fill_value='').itertuples(index=False))
+        for i, item in enumerate(self.items):
+            if i < len(window):
+                self.tree.move(item, '', i)
+                self.tree.item(item, values=tuple(window[i]))
+            else:
+                self.tree.detach(item)
+
+        total = self.row_count()
+        if total:
+            self.scroll_y.set(self.offset / total, min(1.0, (self.offset + self.visible_rows) / total))
+        else:
+            self.scroll_y.set(0.0, 1.0)
+
+
+class PerformanceDialog:
+    """性能记录对话框：各阶段及子步骤的耗时、行数、处理速度和内存峰值"""
+
+    COLUMNS = ('次数', '耗时(秒)', '行数', '行/秒', '内存峰值(MB)')
+
+    def __init__(self, parent, profiler, on_export):
+        self.profiler = profiler
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("性能记录")
+        self.dialog.geometry("760x420")
+        self.dialog.transient(parent)
+
+        frame = ttk.Frame(self.dialog, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        self.tree = ttk.Treeview(frame, columns=self.COLUMNS, show='tree headings', height=14)
+        self.tree.heading('#0', text='阶段')
+        self.tree.column('#0', width=260)
+        for col in self.COLUMNS:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=90, anchor=tk.E)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        buttons = ttk.Frame(frame)
+        buttons.pack(pady=10)
+        ttk.Button(buttons, text="刷新", command=self.refresh).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="导出JSON", command=on_export).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="关闭", command=self.dialog.destroy).pack(side=tk.LEFT, padx=5)
+
+        self.refresh()
+
+    def refresh(self):
+        """重新读取性能记录，最近的阶段在最上面"""
+        self.tree.delete(*self.tree.get_children())
+        for node in reversed(self.profiler.summary()):
+            self.insert('', node, f"{node['started'][11:]} {node['name']}")
+
+    def insert(self, parent, node, text):
+        def number(value, fmt):
+            return '' if value is None else format(value, fmt)
+
+        item = self.tree.insert(parent, 'end', text=text, values=(
+            node['calls'], f"{node['seconds']:.3f}", number(node['rows'], ','),
+            number(node['rows_per_second'], ',.0f'), number(node['peak_mb'], '.1f')))
+        for child in node['children']:
+            self.insert(item, child, child['name'])
+
+
+class GroupDiagnosticsDialog:
+    """考勤组诊断对话框"""
+
+    def __init__(self, parent, table):
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("考勤组诊断")
+        self.dialog.geometry("520x320")
+        self.dialog.transient(parent)
+
+        frame = ttk.Frame(self.dialog, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        ttk.Label(frame, text="以下记录无法匹配已知考勤组，统计时按右侧的考勤组处理：").pack(anchor=tk.W, pady=5)
+
+        columns = list(table.columns)
+        tree = ttk.Treeview(frame, columns=columns, show='headings', height=10)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=120)
+        for values in table.itertuples(index=False):
+            tree.insert('', 'end', values=tuple(values))
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        ttk.Button(frame, text="确定", command=self.dialog.destroy).pack(pady=10)
+
 
 class AboutDialog:
     """关于对话框"""
 
-    def __init__(self, parent):
+    def __init__(self, parent, group_rules):
         self.dialog = tk.Toplevel(parent)
         self.dialog.title("关于")
         self.dialog.geometry("400x300")
@@ -783,10 +1224,10 @@ class AboutDialog:
         ttk.Label(frame, text="版本: v2.0 - 多组别版本").pack(pady=5)
         ttk.Label(frame, text="").pack(pady=5)
 
-        info_text = """支持的考勤组:
-• 教师组: 每天2次打卡，每周10次
-• 行政组: 每天4次打卡，每周20次  
-• 后勤组: 每天4次打卡，每周20次
+        groups_text = "\n".join(f"• {name}: 每天{rule['daily_punches']}次打卡，每周{rule['weekly_punches']}次"
+                                 for name, rule in group_rules.items())
+        info_text = f"""支持的考勤组:
+{groups_text}
 
 功能特点:
 • 自动识别考勤组
@@ -811,8 +1252,14 @@ def add_menu(root, app):
     file_menu = tk.Menu(menubar, tearoff=0)
     menubar.add_cascade(label="文件", menu=file_menu)
     file_menu.add_command(label="打开文件", command=app.load_file)
+    file_menu.add_command(label="批量打开文件", command=app.load_files)
+    file_menu.add_command(label="打开文件夹", command=app.load_directory)
+    file_menu.add_command(label="追加考勤文件", command=app.append_file)
     file_menu.add_command(label="导出结果", command=app.export_results)
     file_menu.add_separator()
+    file_menu.add_command(label="打开统计状态", command=app.open_state)
+    file_menu.add_command(label="保存统计状态", command=app.save_state)
+    file_menu.add_separator()
     file_menu.add_command(label="退出", command=root.quit)
 
     # 工具菜单
@@ -820,16 +1267,30 @@ def add_menu(root, app):
     menubar.add_cascade(label="工具", menu=tools_menu)
     tools_menu.add_command(label="清空日志", command=app.clear_log)
     tools_menu.add_command(label="清空特殊休息日", command=app.clear_holidays)
+    tools_menu.add_command(label="清空文件缓存", command=app.clear_cache)
+    tools_menu.add_command(label="考勤组诊断", command=app.show_group_diagnostics)
+    tools_menu.add_command(label="重新加载考勤规则", command=app.reload_rules)
+    tools_menu.add_separator()
+    tools_menu.add_checkbutton(label="后台任务启用 cProfile", variable=app.profile_var,
+                               command=app.on_profile_toggle)
+
+    # 性能菜单
+    perf_menu = tk.Menu(menubar, tearoff=0)
+    menubar.add_cascade(label="性能", menu=perf_menu)
+    perf_menu.add_command(label="性能记录", command=app.show_performance)
+    perf_menu.add_command(label="导出性能记录(JSON)", command=app.export_performance)
+    perf_menu.add_command(label="清空性能记录", command=app.clear_performance)
 
     # 帮助菜单
     help_menu = tk.Menu(menubar, tearoff=0)
     menubar.add_cascade(label="帮助", menu=help_menu)
-    help_menu.add_command(label="关于", command=lambda: AboutDialog(root))
+    help_menu.add_command(label="关于", command=lambda: AboutDialog(root, app.group_rules))
 
 
 def main():
     """主函数"""
     try:
+        startup_timings = {'模块导入': time.perf_counter() - STARTUP_TIME}
         root = tk.Tk()
 
         # 设置应用图标（如果有的话）
@@ -840,6 +1301,8 @@ def main():
 
         app = AttendanceChecker(root)
         add_menu(root, app)
+        app.startup_timings.update(startup_timings)
+        app.startup_timings['界面创建'] = time.perf_counter() - STARTUP_TIME
 
         # 居中显示窗口
         root.update_idletasks()
@@ -849,6 +1312,20 @@ def main():
         y = (root.winfo_screenheight() // 2) - (height // 2)
         root.geometry(f'{width}x{height}+{x}+{y}')
 
+        # 先绘制窗口，再在后台加载 pandas/numpy
+        root.update()
+        app.startup_timings['首次显示'] = time.perf_counter() - STARTUP_TIME
+
+        # 启动计时模式：输出各阶段耗时后退出
+        on_ready = None
+        if '--startup-timing' in sys.argv[1:]:
+            def on_ready():
+                if sys.stdout is not None:
+                    for name, seconds in app.startup_timings.items():
+                        print(f"{name}: {seconds:.3f}秒")
+                root.after(100, root.destroy)
+
+        app.load_libraries_async(on_ready)
         root.mainloop()
 
     except Exception as e:
@@ -863,4 +1340,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+考勤打卡统计程序 - 命令行版本
+不依赖 tkinter，可在无界面的服务器上批量运行
+
+用法:
+    python attendance_cli.py 考勤.xlsx --group 教师组 --holiday 2025-10-01 -o 考勤统计.xlsx
+    python attendance_cli.py 考勤目录/ 其他校区.xlsx --workers 4 -o 考勤统计.xlsx
+    python attendance_cli.py 今日考勤.xlsx --state 考勤统计状态.pkl -o 考勤统计.xlsx
+    python attendance_cli.py 考勤目录/ -g 全部考勤组 --daily -o 考勤统计.parquet
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+
+from datetime import datetime
+
+import attendance_engine
+from workbook_cache import WorkbookCache
+
+
+def log(message, level='INFO'):
+    """写入日志（标准错误输出）"""
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"[{timestamp}] [{level}] {message}", file=sys.stderr)
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="考勤打卡统计（命令行版本）")
+    parser.add_argument('inputs', nargs='+', help="考勤Excel文件或包含 .xlsx 文件的目录，可指定多个")
+    parser.add_argument('-g', '--group',
+                        help=f"统计的考勤组，{attendance_engine.ALL_GROUPS} 表示一次统计所有组（默认: 规则配置中的第一个考勤组；已有 --state 时沿用状态中的考勤组）")
+    parser.add_argument('--rules', metavar='PATH',
+                        help=f"考勤组规则配置文件（默认: {attendance_engine.RULES_FILE_NAME}）")
+    parser.add_argument('--punch-mode',
+                        choices=attendance_engine.PUNCH_MODES,
+                        help=f"判定方式：按导出的打卡结果，或按打卡时间和考勤组时限重新判定"
+                             f"（默认: {attendance_engine.EVALUATE_BY_RESULT}；已有 --state 时沿用状态中的判定方式）")
+    parser.add_argument('--holiday', action='append', default=[], metavar='YYYY-MM-DD',
+                        help="特殊休息日，可重复指定；使用 --state 时指定后替换状态中保存的特殊休息日")
+    parser.add_argument('-o', '--output',
+                        help="导出文件路径，扩展名为 .csv / .parquet / .feather 时导出对应格式"
+                             "（默认: 考勤统计_<考勤组>_<时间>.xlsx）")
+    parser.add_argument('--daily', action='store_true',
+                        help="导出 .parquet / .feather 时另存逐日明细（*_逐日明细）")
+    parser.add_argument('--no-cache', action='store_true', help="不使用文件解析缓存")
+    parser.add_argument('--state', metavar='PATH',
+                        help="增量统计状态文件：存在时只把新记录追加到已有统计，完成后写回")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="并行解析的进程数（默认: CPU 核数）")
+    args = parser.parse_args(argv)
+
+    # 验证日期格式，统一保存为 YYYY-MM-DD
+    holidays = set()
+    for date_str in args.holiday:
+        try:
+            holidays.add(datetime.strptime(date_str.strip(), '%Y-%m-%d').strftime('%Y-%m-%d'))
+        except ValueError:
+            parser.error(f"日期格式错误: {date_str}，请使用 YYYY-MM-DD 格式")
+    args.holiday = holidays
+
+    # 读取考勤组规则并检查考勤组；未指定的 --group / --punch-mode 保持为 None，
+    # 使用 --state 时沿用状态中的设置，否则在统计时取默认值
+    try:
+        args.group_rules = attendance_engine.load_group_rules(args.rules)
+    except (OSError, ValueError) as e:
+        parser.error(f"无法读取考勤组规则: {e}")
+    if (args.group is not None and args.group not in args.group_rules
+            and args.group != attendance_engine.ALL_GROUPS):
+        parser.error(f"未知的考勤组: {args.group}，可选: {', '.join(args.group_rules)}, {attendance_engine.ALL_GROUPS}")
+    return args
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    cache = None if args.no_cache else WorkbookCache()
+
+    try:
+        log(f"正在加载: {', '.join(args.inputs)}")
+        df = attendance_engine.load_attendance_files(args.inputs, workers=args.workers, cache=cache, log=log,
+                                                     group_rules=args.group_rules)
+        log(f"文件加载成功！共 {len(df)} 条记录")
+
+        if args.state and os.path.exists(args.state):
+            # 追加到已有的统计状态，考勤组沿用状态中的设置
+            analysis = attendance_engine.IncrementalAnalysis.load(args.state)
+            if args.group is not None and analysis.group != args.group:
+                log(f"统计状态的考勤组为 {analysis.group}，忽略 --group {args.group}", 'WARNING')
+            if args.punch_mode is not None and analysis.punch_mode != args.punch_mode:
+                log(f"统计状态的判定方式为 {analysis.punch_mode}，忽略 --punch-mode {args.punch_mode}", 'WARNING')
+            # 未指定 --holiday 时沿用状态中的特殊休息日，指定时以命令行为准
+            saved = set(analysis.holidays.astype(str))
+            if args.holiday and args.holiday != saved:
+                added, removed = sorted(args.holiday - saved), sorted(saved - args.holiday)
+                log(f"特殊休息日已按 --holiday 更新: 新增 {', '.join(added) or '无'}，"
+                    f"移除 {', '.join(removed) or '无'}", 'WARNING')
+                analysis.update(args.holiday)
+            elif saved:
+                log(f"沿用统计状态中的特殊休息日: {', '.join(sorted(saved))}")
+            added, skipped = analysis.append(df)
+            log(f"已追加到统计状态: 新增 {added} 条记录，跳过 {skipped} 条已导入的记录")
+        else:
+            group = args.group or next(iter(args.group_rules))
+            punch_mode = args.punch_mode or attendance_engine.EVALUATE_BY_RESULT
+            log(f"开始统计分析 - 当前选择: {group}，判定方式: 按{punch_mode}")
+            analysis = attendance_engine.IncrementalAnalysis(df, args.group_rules, group,
+                                                             args.holiday, punch_mode=punch_mode)
+
+        fallback_group = attendance_engine.selected_groups(analysis.group_rules, analysis.group,
+                                                           analysis.default_group)[1]
+        diagnostics = attendance_engine.group_fallbacks(df, analysis.group_rules, fallback_group)
+        results = attendance_engine.WeeklyResults(analysis.weekly, analysis.group, diagnostics)
+        log(f"统计完成！共生成 {len(results)} 条周统计记录")
+        for row in diagnostics.itertuples(index=False):
+            log(f"未识别考勤组 {row.原始考勤组}: {row.记录数} 条记录 / {row.人数} 人，已按{row.归入考勤组}统计", 'WARNING')
+
+        if args.state:
+            analysis.save(args.state)
+            log(f"统计状态已保存到: {args.state}")
+
+        output = args.output or f"考勤统计_{analysis.group}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        daily = analysis.daily_frame() if args.daily else None
+        attendance_engine.write_results(results, output, log=log, group_rules=analysis.group_rules,
+                                        daily=daily)
+        log(f"结果已导出到: {output}")
+    except Exception as e:
+        log(f"处理失败: {str(e)}", 'ERROR')
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+考勤组规则和公共常量
+只依赖标准库，界面启动时先导入本模块显示窗口，pandas/numpy 和统计引擎在后台加载
+"""
+
+import os
+import json
+import sys
+
+
+# 一次统计所有考勤组
+ALL_GROUPS = '全部考勤组'
+
+# 打卡判定方式：按导出的打卡结果文字，或按打卡时间和各考勤组的时限重新判定
+EVALUATE_BY_RESULT = '打卡结果'
+EVALUATE_BY_TIME = '打卡时间'
+PUNCH_MODES = [EVALUATE_BY_RESULT, EVALUATE_BY_TIME]
+
+# 按打卡时间判定时追加的列：上班晚于时限、下班早于时限的分钟数合计
+LATE_MINUTES_COLUMN = '迟到早退分钟'
+
+# 打卡状态编码，哪些状态视为正常由考勤组规则的 normal_statuses 决定
+STATUS_NORMAL = 0
+STATUS_MAKEUP = 1
+STATUS_LEAVE = 2
+STATUS_SEVERE_LATE = 3
+STATUS_MISSING = 4
+STATUS_OTHER = 5
+
+STATUS_CODES = {
+    '正常': STATUS_NORMAL,
+    '补卡': STATUS_MAKEUP,
+    '请假': STATUS_LEAVE,
+    '严重迟到': STATUS_SEVERE_LATE,
+    '缺卡': STATUS_MISSING,
+}
+
+# 规则配置中可用的状态名称
+STATUS_NAMES = dict(STATUS_CODES, 其他=STATUS_OTHER)
+
+# 加载导出文件时保留的打卡列（按位置命名，最多4次打卡），规则的 punch_columns 只能取这些列
+PUNCH_COLUMNS = ["上班1打卡时间", "上班1打卡结果", "下班1打卡时间", "下班1打卡结果",
+                 "上班2打卡时间", "上班2打卡结果", "下班2打卡时间", "下班2打卡结果"]
+
+# 考勤组规则配置文件，打包为可执行文件时优先读取可执行文件旁的配置
+RULES_FILE_NAME = 'attendance_rules.json'
+
+
+def punch_count(rule):
+    """规则中参与判定的打卡次数（打卡结果列数）"""
+    return len([col for col in rule['punch_columns'] if col.endswith('结果')])
+
+
+def default_absence_segments(punches):
+    """默认的旷工分段：每两次打卡（上午/下午）为一段，奇数次时最后一次单独为一段"""
+    return [list(range(i, min(i + 2, punches))) for i in range(0, punches, 2)]
+
+
+def check_rule(name, rule):
+    """检查一个考勤组规则并补全默认值，返回新的规则"""
+    for key in ('daily_punches', 'weekly_punches', 'punch_columns'):
+        if key not in rule:
+            raise ValueError(f"考勤组 {name} 缺少配置项: {key}")
+
+    unknown = [col for col in rule['punch_columns'] if col not in PUNCH_COLUMNS]
+    if unknown:
+        raise ValueError(f"考勤组 {name} 的 punch_columns 包含未知的列: {', '.join(map(str, unknown))}，"
+                         f"可选: {', '.join(PUNCH_COLUMNS)}")
+    if punch_count(rule) == 0:
+        raise ValueError(f"考勤组 {name} 的 punch_columns 中没有打卡结果列")
+    if rule['daily_punches'] != punch_count(rule):
+        raise ValueError(f"考勤组 {name} 的 daily_punches 为 {rule['daily_punches']}，"
+                         f"与 punch_columns 中的打卡结果列数 {punch_count(rule)} 不一致")
+
+    # 打卡时间列按顺序与打卡结果列一一对应（如 上班1打卡时间 对应 上班1打卡结果）
+    time_columns = [col for col in rule['punch_columns'] if col.endswith('时间')]
+    time_prefixes = [col[:-len('打卡时间')] for col in time_columns]
+    result_prefixes = [col[:-len('打卡结果')] for col in rule['punch_columns'] if col.endswith('结果')]
+    if time_columns and time_prefixes != result_prefixes:
+        raise ValueError(f"考勤组 {name} 的打卡时间列与打卡结果列不对应: "
+                         f"{', '.join(time_prefixes)} / {', '.join(result_prefixes)}")
+
+    rule = dict(rule)
+    rule.setdefault('punch_times', [])
+    if rule['punch_times'] and len(rule['punch_times']) != len(time_columns):
+        raise ValueError(f"考勤组 {name} 的 punch_times 与打卡时间列数量不一致")
+
+    for status in rule.get('normal_statuses', []):
+        if status not in STATUS_NAMES:
+            raise ValueError(f"未知的打卡状态: {status}")
+    punches = punch_count(rule)
+    rule.setdefault('absence_segments', default_absence_segments(punches))
+    for segment in rule['absence_segments']:
+        if not segment or max(segment) >= punches or min(segment) < 0:
+            raise ValueError(f"旷工分段超出打卡次数: {segment}")
+
+    rule.setdefault('description', f"每天{rule['daily_punches']}次打卡")
+    return rule
+
+
+def rules_search_paths():
+    """考勤组规则配置的查找位置"""
+    paths = []
+    if getattr(sys, 'frozen', False):
+        paths.append(os.path.join(os.path.dirname(sys.executable), RULES_FILE_NAME))
+    paths.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), RULES_FILE_NAME))
+    return paths
+
+
+def read_rules_config(file_path=None):
+    """读取考勤组规则配置（JSON），返回 {考勤组: 原始规则}"""
+    if file_path is None:
+        file_path = next((path for path in rules_search_paths() if os.path.exists(path)),
+                         rules_search_paths()[-1])
+    with open(file_path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    groups = config.get('groups', {})
+    if not groups:
+        raise ValueError(f"考勤组规则配置中没有考勤组: {file_path}")
+    return groups
+
+
+def load_group_rules(file_path=None):
+    """
+    读取并检查考勤组规则
+
+    未指定 file_path 时按 rules_search_paths 查找。返回的规则不含编译后的判定，
+    统计时由 attendance_engine 按需编译；需要编译好的规则时使用 attendance_engine.load_group_rules。
+    """
+    return {name: check_rule(name, rule) for name, rule in read_rules_config(file_path).items()}
+
+
+def rules_sheet_rows(group_rules):
+    """导出的考勤规则说明"""
+    rows = [['考勤组', '每天打卡次数', '每周打卡次数', '规则说明']]
+    for name, rule in group_rules.items():
+        rows.append([name, str(rule['daily_punches']), str(rule['weekly_punches']), rule['description']])
+    return rows
@@ -0,0 +1,1632 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+考勤统计分析引擎
+以列运算代替逐行循环，完成打卡分类、每日计数和按(员工, 周)的聚合
+"""
+
+import os
+import re
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import numpy as np
+
+from datetime import datetime, time as time_of_day
+from pandas.io.parsers import TextParser
+
+import attendance_config
+import attendance_profiler
+from attendance_config import (ALL_GROUPS, EVALUATE_BY_RESULT, EVALUATE_BY_TIME, PUNCH_MODES,
+                               LATE_MINUTES_COLUMN, STATUS_NORMAL, STATUS_MAKEUP, STATUS_LEAVE,
+                               STATUS_SEVERE_LATE, STATUS_MISSING, STATUS_OTHER, STATUS_CODES,
+                               STATUS_NAMES, RULES_FILE_NAME, rules_sheet_rows)
+
+
+class PunchEvaluator:
+    """
+    由考勤组规则编译出的每日打卡判定
+
+    规则中的正常状态、旷工分段和严重迟到方式在加载时转换为查找表和下标数组，
+    判定时对 (行 × 打卡次数) 的状态编码矩阵做列运算。
+    """
+
+    def __init__(self, rule):
+        punches = attendance_config.punch_count(rule)
+
+        self.normal = np.zeros(len(STATUS_NAMES), dtype=bool)
+        for name in rule.get('normal_statuses', ['正常', '补卡', '请假']):
+            self.normal[STATUS_NAMES[name]] = True
+
+        segments = rule.get('absence_segments', attendance_config.default_absence_segments(punches))
+        self.segments = [np.array(segment, dtype=np.int64) for segment in segments]
+
+        severe_late = rule.get('severe_late', {})
+        self.requires_normal = bool(severe_late.get('requires_normal', True))
+        self.counts_as_normal = bool(severe_late.get('counts_as_normal', True))
+        self.per_punch = bool(severe_late.get('per_punch', False))
+
+    def __call__(self, statuses):
+        """按打卡状态编码（行 × 打卡次数）计算每天的正常、迟到、旷工次数"""
+        missing = statuses == STATUS_MISSING
+        normal_count = self.normal[statuses].sum(axis=1)
+        absent_count = np.zeros(len(statuses), dtype=np.int64)
+        for segment in self.segments:
+            absent_count += missing[:, segment].any(axis=1)
+
+        # 缺卡的当天不记迟到
+        severe = statuses == STATUS_SEVERE_LATE
+        late_count = severe.sum(axis=1) if self.per_punch else severe.any(axis=1).astype(np.int64)
+        eligible = ~missing.any(axis=1)
+        if self.requires_normal:
+            eligible &= (statuses == STATUS_NORMAL).any(axis=1)
+        late_count = np.where(eligible, late_count, 0)
+
+        if self.counts_as_normal:
+            normal_count = normal_count + late_count
+        return normal_count, late_count, absent_count
+
+
+def compile_rule(name, rule):
+    """检查一个考勤组规则并编译判定，返回带 evaluator 的规则"""
+    rule = attendance_config.check_rule(name, rule)
+    rule['evaluator'] = PunchEvaluator(rule)
+    return rule
+
+
+def compile_rules(group_rules):
+    """为尚未编译的规则（例如 attendance_config.load_group_rules 读取的规则）补上判定"""
+    return {name: rule if 'evaluator' in rule else compile_rule(name, rule)
+            for name, rule in group_rules.items()}
+
+
+def load_group_rules(file_path=None):
+    """
+    读取考勤组规则配置（JSON）
+
+    未指定 file_path 时按 rules_search_paths 查找。每个考勤组的规则在加载时编译为 PunchEvaluator，
+    新增考勤组只需修改配置文件。
+    """
+    return {name: compile_rule(name, rule)
+            for name, rule in attendance_config.read_rules_config(file_path).items()}
+
+
+# 默认配置文件中的考勤组规则，第一次使用时读取
+_default_group_rules = None
+
+
+def default_group_rules():
+    """
+    默认的考勤组规则（按 rules_search_paths 查找配置文件）
+
+    在第一次使用时读取，缺少默认配置文件时仍可导入本模块并使用其他规则文件。
+    """
+    global _default_group_rules
+    if _default_group_rules is None:
+        _default_group_rules = load_group_rules()
+    return _default_group_rules
+
+
+# 周统计结果列
+WEEKLY_COLUMNS = ['姓名', '部门', '考勤组', '周期', '应打卡', '实际打卡',
+                  '正常次数', '迟到次数', '旷工次数', '周结果']
+
+# 增量统计状态文件格式版本，结构变化时递增
+STATE_VERSION = 2
+
+# 逐日计数列（按周累加）
+DAILY_COUNT_COLUMNS = ['实际打卡', '正常次数', '迟到次数', '旷工次数']
+
+# 个人汇总列
+SUMMARY_COLUMNS = ['姓名', '部门', '考勤组', '统计周数', '正常周数', '迟到周数', '旷工周数', '正常率']
+
+# 基础列
+BASE_COLUMNS = ["姓名", "考勤组", "部门", "主部门", "工号", "职位", "UserId", "日期", "workDate", "班次"]
+
+# 教师组列（2次打卡）
+TEACHER_COLUMNS = ["上班1打卡时间", "上班1打卡结果", "下班1打卡时间", "下班1打卡结果"]
+
+# 行政/后勤组列（4次打卡），也是加载时保留的全部打卡列
+ADMIN_COLUMNS = attendance_config.PUNCH_COLUMNS
+
+# 打卡时间列和打卡结果列
+PUNCH_TIME_COLUMNS = ADMIN_COLUMNS[0::2]
+PUNCH_RESULT_COLUMNS = ADMIN_COLUMNS[1::2]
+
+# 每个分块处理的行数
+ANALYSIS_CHUNK_ROWS = 50000
+
+# 流式读取：考勤导出文件前两行为标题，只保留标准化需要的前 18 列
+HEADER_SKIP_ROWS = 2
+STREAM_MAX_COLUMNS = len(BASE_COLUMNS) + len(ADMIN_COLUMNS)
+LOAD_CHUNK_ROWS = 20000
+
+# 流式导出 Excel：每次转换并写入的行数
+EXPORT_CHUNK_ROWS = 20000
+
+# 列式导出格式（需要 pyarrow），保留列类型，读取时无需再解析
+COLUMNAR_FORMATS = {'.parquet': 'Parquet', '.feather': 'Feather'}
+
+# 列式导出时转为分类类型的文字列
+COLUMNAR_CATEGORY_COLUMNS = ['姓名', '部门', '考勤组', '周期', '周结果']
+
+# 日期标准化后追加的列
+DATE_COLUMN = '日期值'
+WEEKDAY_COLUMN = '星期序号'
+WEEK_START_COLUMN = '周起始'
+
+# Excel 错误值，读取时视为缺失
+_ERROR_CODES = ('#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A')
+
+# 按考勤组规则解析出的考勤组（分类列，未识别的为缺失值）
+GROUP_COLUMN = '所属考勤组'
+
+# 精简内存：保留统计用到的列，重复的字符串列转为分类类型，
+# 打卡时间转为当天的分钟数（int16，缺失为 MISSING_TIME）
+COMPACT_COLUMNS = (['姓名', '考勤组', '部门', 'UserId'] + ADMIN_COLUMNS
+                   + [DATE_COLUMN, WEEKDAY_COLUMN, WEEK_START_COLUMN, GROUP_COLUMN])
+CATEGORY_COLUMNS = ['姓名', '部门', '考勤组', 'UserId'] + PUNCH_RESULT_COLUMNS
+MISSING_TIME = -1
+
+# 流式加载只读取的列及其在标准格式中的位置，工号、职位、workDate、班次、主部门 不读取
+STREAM_COLUMNS = ['姓名', '考勤组', '部门', 'UserId', '日期'] + ADMIN_COLUMNS
+STREAM_POSITIONS = [(BASE_COLUMNS + ADMIN_COLUMNS).index(col) for col in STREAM_COLUMNS]
+
+# 考勤组诊断表列
+DIAGNOSTIC_COLUMNS = ['原始考勤组', '记录数', '人数', '归入考勤组']
+
+# 备忘表超过该项数时清空
+_MEMO_LIMIT = 100000
+
+# 原始日期取值 -> Timestamp 的备忘表
+_date_memo = {}
+
+# 打卡时间中的 时:分
+_TIME_PATTERN = re.compile(r'(\d{1,2}):(\d{2})')
+
+# 原始打卡时间 -> 分钟数 的备忘表
+_time_memo = {}
+
+# 原始打卡结果 -> 状态编码 的备忘表，多次统计之间共用
+_status_memo = {}
+
+
+class AnalysisCancelled(Exception):
+    """统计任务被用户取消"""
+
+
+def _convert_cell(value):
+    """按 pandas 读取 Excel 时的规则转换单元格值"""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if value.is_integer():
+            return int(value)
+        return value
+    if isinstance(value, str) and value in _ERROR_CODES:
+        return np.nan
+    return value
+
+
+def read_workbook(file_path, progress=None, chunk_rows=LOAD_CHUNK_ROWS):
+    """
+    读取完整的考勤导出表格
+
+    以只读模式逐行读取第一个工作表的单元格值，只保留 standardize_columns 需要的前
+    STREAM_MAX_COLUMNS 列，每读完 chunk_rows 行调用一次 progress(已读行数, 总行数)。
+    最后用 pandas 的解析器统一推断类型，结果与 pd.read_excel(file_path, skiprows=2)
+    的对应列一致。所有单元格值保留到最后，统计加载使用 read_compact_workbook，
+    只有无法识别表格格式时才用本函数。
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = workbook.worksheets[0]
+        total_rows = sheet.max_row or 0
+        sheet.reset_dimensions()
+
+        rows = []
+        width = 0
+        last_row_with_data = -1
+        for row_number, row in enumerate(sheet.iter_rows(values_only=True)):
+            # 去掉行尾的空单元格
+            length = len(row)
+            while length and (row[length - 1] is None or row[length - 1] == ''):
+                length -= 1
+            if length:
+                last_row_with_data = row_number
+                width = max(width, length)
+
+            rows.append([_convert_cell(value) for value in row[:min(length, STREAM_MAX_COLUMNS)]])
+            if progress is not None and len(rows) % chunk_rows == 0:
+                progress(len(rows), max(total_rows, len(rows)))
+    finally:
+        workbook.close()
+
+    # 去掉末尾的空行，并把各行补齐到相同列数
+    rows = rows[:last_row_with_data + 1]
+    if not rows:
+        return pd.DataFrame()
+    width = min(width, STREAM_MAX_COLUMNS)
+    rows = [row + [''] * (width - len(row)) if len(row) < width else row for row in rows]
+
+    df = TextParser(rows, header=0, skiprows=HEADER_SKIP_ROWS, skip_blank_lines=False).read()
+    if progress is not None:
+        progress(len(rows), len(rows))
+    return df
+
+
+def infer_cell_types(values, has_missing=False):
+    """
+    按 pandas 读取 Excel 时的规则推断一列取值的类型
+
+    对 values（一列中不同的单元格值）执行与整列相同的解析：全为数字时转为数字，
+    has_missing 为 True 时按含缺失值的列推断（整数列变为浮点）。返回与 values 等长的数组。
+    """
+    rows = [['值']] + [[value] for value in values] + ([['']] if has_missing else [])
+    typed = TextParser(rows, header=0, skip_blank_lines=False).read()['值'].to_numpy()
+    return typed[:len(values)]
+
+
+class CategoryColumnBuilder:
+    """
+    分块累积的分类列
+
+    每块只保存原始取值的整数编码，不同取值各存一份；全部读完后按 pandas 的规则推断取值类型，
+    生成与 astype('category') 相同的分类列。
+    """
+
+    def __init__(self):
+        self.values = {}  # 原始取值 -> 编码（按首次出现）
+        self.parts = []
+
+    def code(self, value):
+        if isinstance(value, str) and value == '':
+            return -1
+        return self.values.setdefault(value, len(self.values))
+
+    def add(self, values):
+        self.parts.append(map_unique(np.array(values, dtype=object), self.code, -1, np.int32))
+
+    def finish(self, length):
+        codes = np.concatenate(self.parts)[:length] if self.parts else np.zeros(0, dtype=np.int32)
+        typed = pd.Categorical(infer_cell_types(list(self.values), bool((codes < 0).any())))
+        # 末尾一项对应缺失值（编码 -1）
+        lookup = np.append(typed.codes, -1)
+        return pd.Categorical.from_codes(lookup[codes], categories=typed.categories)
+
+
+def read_compact_workbook(file_path, progress=None, chunk_rows=LOAD_CHUNK_ROWS):
+    """
+    流式读取并精简考勤导出文件
+
+    以只读模式逐行读取第一个工作表，只取统计用到的 STREAM_COLUMNS。每读完 chunk_rows 行
+    立即转换为精简类型并丢弃单元格值：文字列记为分类编码，打卡时间转为 int16 分钟数，
+    日期经 normalize_dates 转为 DATE_COLUMN 等列；每块调用一次 progress(已读行数, 总行数)。
+    结果与 read_workbook + standardize_columns + normalize_dates + compact_frame 相同
+    （不含 GROUP_COLUMN）。表格列数不是教师组或行政组格式时返回 None。
+    """
+    from openpyxl import load_workbook
+
+    categories = {col: CategoryColumnBuilder() for col in STREAM_COLUMNS if col in CATEGORY_COLUMNS}
+    minutes = {col: [] for col in PUNCH_TIME_COLUMNS}
+    dates = []
+
+    def convert(chunk):
+        columns = dict(zip(STREAM_COLUMNS, zip(*chunk)))
+        with attendance_profiler.phase('精简内存', len(chunk)):
+            for col, builder in categories.items():
+                builder.add(columns[col])
+            for col, parts in minutes.items():
+                parts.append(map_unique(np.array(columns[col], dtype=object), parse_time_of_day,
+                                        MISSING_TIME, np.int16, _time_memo))
+        with attendance_profiler.phase('日期解析', len(chunk)):
+            frame = normalize_dates(pd.DataFrame({'日期': np.array(columns['日期'], dtype=object)}))
+            dates.append(frame[[DATE_COLUMN, WEEKDAY_COLUMN, WEEK_START_COLUMN]])
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = workbook.worksheets[0]
+        total_rows = sheet.max_row or 0
+        sheet.reset_dimensions()
+
+        chunk = []
+        width = 0
+        last_row_with_data = -1
+        for row_number, row in enumerate(sheet.iter_rows(values_only=True)):
+            # 与 read_workbook 相同：去掉行尾的空单元格，记录列数和最后一个非空行
+            length = len(row)
+            while length and (row[length - 1] is None or row[length - 1] == ''):
+                length -= 1
+            if length:
+                last_row_with_data = row_number
+                width = max(width, length)
+
+            # 标题行和表头不读取，列名按位置确定
+            if row_number <= HEADER_SKIP_ROWS:
+                continue
+            chunk.append([_convert_cell(row[i]) if i < length else '' for i in STREAM_POSITIONS])
+            if len(chunk) == chunk_rows:
+                convert(chunk)
+                chunk = []
+                if progress is not None:
+                    done = row_number - HEADER_SKIP_ROWS
+                    progress(done, max(total_rows - HEADER_SKIP_ROWS - 1, done))
+        if chunk:
+            convert(chunk)
+    finally:
+        workbook.close()
+
+    # standardize_columns 只按位置重命名这两种列数的表格
+    width = min(width, STREAM_MAX_COLUMNS)
+    if width not in (len(BASE_COLUMNS) + len(TEACHER_COLUMNS), len(BASE_COLUMNS) + len(ADMIN_COLUMNS)):
+        return None
+
+    # 去掉末尾的空行
+    length = max(last_row_with_data - HEADER_SKIP_ROWS, 0)
+    punch_columns = ADMIN_COLUMNS[:width - len(BASE_COLUMNS)]
+    df = pd.DataFrame({col: categories[col].finish(length) for col in ['姓名', '考勤组', '部门', 'UserId']})
+    for col in punch_columns:
+        if col in minutes:
+            df[col] = np.concatenate(minutes[col])[:length] if minutes[col] else np.zeros(0, dtype=np.int16)
+        else:
+            df[col] = categories[col].finish(length)
+    if dates:
+        date_frame = pd.concat(dates, ignore_index=True).iloc[:length]
+    else:
+        date_frame = normalize_dates(pd.DataFrame({'日期': pd.Series([], dtype=object)}))
+    for col in [DATE_COLUMN, WEEKDAY_COLUMN, WEEK_START_COLUMN]:
+        df[col] = date_frame[col].to_numpy()
+    if progress is not None:
+        progress(length, length)
+    return df
+
+
+def _no_log(message, level='INFO'):
+    pass
+
+
+def load_attendance_file(file_path, progress=None, cache=None, log=_no_log, group_rules=None):
+    """
+    加载考勤文件
+
+    读取工作簿、标准化列名并完成日期标准化和考勤组解析。提供 cache（WorkbookCache）时，
+    文件未变化则直接返回缓存的结果，否则解析后写入缓存。未指定 group_rules 时使用默认规则。
+    """
+    if group_rules is None:
+        group_rules = default_group_rules()
+    if cache is not None:
+        with attendance_profiler.phase('读取缓存') as step:
+            cache_key = cache.key(file_path)
+            df = cache.load(cache_key)
+        if df is not None:
+            step.rows = len(df)
+            log(f"命中解析缓存，跳过解析（{step.seconds * 1000:.0f} 毫秒）")
+            if not has_resolved_groups(df, group_rules):
+                resolve_groups(df, group_rules)
+            if progress is not None:
+                progress(len(df), len(df))
+            return df
+
+    # 流式读取Excel文件，跳过前两行标题，按块转换为精简类型
+    with attendance_profiler.phase('读取工作簿') as step:
+        df = read_compact_workbook(file_path, progress=progress)
+        step.rows = None if df is None else len(df)
+
+    if df is None:
+        # 无法按位置识别列的表格：读取完整表格后再标准化和精简
+        log("表格列数与教师组/行政组格式不符，读取完整表格", 'WARNING')
+        with attendance_profiler.phase('读取完整表格') as step:
+            df = read_workbook(file_path, progress=progress)
+            step.rows = len(df)
+        with attendance_profiler.phase('标准化列名', len(df)):
+            standardize_columns(df)
+        with attendance_profiler.phase('日期解析', len(df)):
+            normalize_dates(df)
+        with attendance_profiler.phase('精简内存', len(df)):
+            df = compact_frame(df)
+
+    # 考勤组解析，后续统计直接读取该列
+    with attendance_profiler.phase('考勤组解析', len(df)):
+        resolve_groups(df, group_rules)
+    log(f"内存占用: {memory_usage(df) / 1024 / 1024:.1f} MB")
+
+    if cache is not None:
+        try:
+            with attendance_profiler.phase('写入缓存', len(df)):
+                cache.store(cache_key, df)
+        except Exception as e:
+            log(f"写入解析缓存失败: {str(e)}", 'WARNING')
+    return df
+
+
+def expand_input_paths(paths):
+    """展开输入路径，目录取其中的 .xlsx 文件（按文件名排序）"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(name for name in os.listdir(path)
+                           if name.lower().endswith('.xlsx') and not name.startswith('~$'))
+            files.extend(os.path.join(path, name) for name in names)
+        else:
+            files.append(path)
+    return files
+
+
+def drop_duplicate_punches(frames):
+    """
+    合并多个文件的记录，去掉不同文件之间 (UserId, 日期) 重复的记录
+
+    多个文件日期范围重叠时，同一个键保留最后一个包含它的文件中的记录（后面的文件通常是
+    更新的导出）；同一文件内重复的记录与 analyze() 一样全部保留。UserId 按字符串比较，
+    缺少 UserId 或日期的记录不参与去重。返回 (合并去重后的 DataFrame, 去掉的行数)。
+    """
+    df = pd.concat(frames, ignore_index=True)
+    if 'UserId' not in df.columns or len(frames) < 2:
+        return df, 0
+
+    has_key = (df['UserId'].notna() & df[DATE_COLUMN].notna()).to_numpy()
+    rows = np.flatnonzero(has_key)
+    if rows.size == 0:
+        return df, 0
+
+    # 键 = UserId 编号 << 21 | 日期天数，与 IncrementalAnalysis.new_records 相同
+    codes, uniques = pd.factorize(df['UserId'].to_numpy(dtype=object)[rows])
+    user_codes = pd.factorize(np.array([str(value) for value in uniques], dtype=object))[0].astype(np.int64)
+    days = df[DATE_COLUMN].to_numpy()[rows].astype('datetime64[D]').astype(np.int64)
+    keys = (user_codes[codes] << 21) | days
+
+    # 每条记录所在文件的序号，只保留最后一个包含该键的文件中的记录
+    sources = np.repeat(np.arange(len(frames)), [len(frame) for frame in frames])[rows]
+    last_source = pd.Series(sources).groupby(keys).transform('max').to_numpy()
+    duplicated = np.zeros(len(df), dtype=bool)
+    duplicated[rows] = sources < last_source
+    removed = int(duplicated.sum())
+    if removed:
+        df = df[~duplicated].reset_index(drop=True)
+    return df, removed
+
+
+def load_attendance_files(paths, workers=None, progress=None, cache=None, log=_no_log,
+                          group_rules=None):
+    """
+    批量加载考勤文件
+
+    paths 可以包含文件和目录。多个文件在进程池中并行解析，按输入顺序合并后
+    去掉不同文件之间 (UserId, 日期) 重复的记录。多个文件时 progress(已完成文件数, 文件总数, '个文件')。
+    """
+    files = expand_input_paths(paths)
+    if not files:
+        raise ValueError("没有找到考勤文件")
+    if group_rules is None:
+        group_rules = default_group_rules()
+
+    if len(files) == 1:
+        return load_attendance_file(files[0], progress=progress, cache=cache, log=log,
+                                    group_rules=group_rules)
+
+    workers = workers or min(len(files), os.cpu_count() or 1)
+    log(f"并行加载 {len(files)} 个文件（{workers} 个进程）")
+    frames = [None] * len(files)
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        # 各文件的子步骤在子进程中执行，这里只记录总耗时
+        with attendance_profiler.phase('并行解析') as step:
+            futures = {executor.submit(load_attendance_file, file_path, None, cache, _no_log, group_rules): i
+                       for i, file_path in enumerate(files)}
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                frames[i] = future.result()
+                log(f"已加载 {os.path.basename(files[i])}: {len(frames[i])} 条记录")
+                if progress is not None:
+                    progress(done, len(files), '个文件')
+            step.rows = sum(len(frame) for frame in frames)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    with attendance_profiler.phase('合并去重', step.rows):
+        df, removed = drop_duplicate_punches(frames)
+    if removed:
+        log(f"已去除 {removed} 条重复记录（UserId + 日期）")
+
+    # 各文件的分类取值不同，合并后重新转为分类类型
+    with attendance_profiler.phase('精简内存', len(df)):
+        df = compact_frame(df)
+    log(f"合并后内存占用: {memory_usage(df) / 1024 / 1024:.1f} MB")
+    return df
+
+
+def standardize_columns(df):
+    """
+    标准化列名
+
+    根据列数判断是教师组格式还是行政/后勤组格式，按位置重命名列。
+    返回重命名的列数，列数不足时不做修改并返回0。
+    """
+    # 检测是教师组还是行政/后勤组（根据列数）
+    if len(df.columns) > len(BASE_COLUMNS) + len(TEACHER_COLUMNS):
+        # 行政/后勤组格式
+        expected_columns = BASE_COLUMNS + ADMIN_COLUMNS
+    else:
+        # 教师组格式
+        expected_columns = BASE_COLUMNS + TEACHER_COLUMNS
+
+    # 重命名列
+    if len(df.columns) < len(expected_columns):
+        return 0
+    column_mapping = {df.columns[i]: expected_columns[i]
+                      for i in range(len(expected_columns))}
+    df.rename(columns=column_mapping, inplace=True)
+    return len(expected_columns)
+
+
+def parse_date(date_str):
+    """解析日期字符串，返回 YYYY-MM-DD 格式"""
+    if pd.isna(date_str):
+        return None
+
+    # 处理各种日期格式
+    date_str = str(date_str).strip()
+
+    # 尝试从 "25-09-08 星期一" 格式中提取日期
+    if '星期' in date_str:
+        date_part = date_str.split()[0]
+        parts = date_part.split('-')
+        if len(parts) == 3:
+            year = '20' + parts[0] if len(parts[0]) == 2 else parts[0]
+            return f"{year}-{parts[1].zfill(2)}-{parts[2].zfill(2)}"
+
+    # 尝试其他格式
+    for fmt in ['%Y-%m-%d', '%y-%m-%d', '%Y/%m/%d', '%y/%m/%d']:
+        try:
+            dt = datetime.strptime(date_str.split()[0], fmt)
+            return dt.strftime('%Y-%m-%d')
+        except:
+            continue
+
+    return None
+
+
+def _parse_date_value(value):
+    """把单个原始日期值解析为 Timestamp，无法解析时返回 NaT"""
+    date_str = parse_date(value)
+    if date_str is None:
+        return pd.NaT
+    try:
+        return pd.Timestamp(datetime.strptime(date_str, '%Y-%m-%d'))
+    except (ValueError, OverflowError):
+        return pd.NaT
+
+
+def normalize_dates(df):
+    """
+    日期标准化（每个文件执行一次）
+
+    将 日期 列转换为 datetime64 列，并预先计算星期序号（周一为0，无效日期为-1）
+    和所在周周一的日期。每个不同的原始取值只通过备忘表解析一次。
+    """
+    raw_dates = df['日期'] if '日期' in df.columns else pd.Series([None] * len(df), index=df.index)
+    codes, uniques = pd.factorize(raw_dates, use_na_sentinel=True)
+
+    if len(_date_memo) > _MEMO_LIMIT:
+        _date_memo.clear()
+    parsed = []
+    for value in uniques:
+        if value not in _date_memo:
+            _date_memo[value] = _parse_date_value(value)
+        parsed.append(_date_memo[value])
+
+    # 末尾追加 NaT，缺失值的编码 -1 正好取到它
+    unique_dates = pd.DatetimeIndex(parsed + [pd.NaT], dtype='datetime64[ns]').to_numpy()
+    unique_days = unique_dates.astype('datetime64[D]')
+    unique_valid = ~np.isnat(unique_dates)
+    # 1970-01-01 是星期四
+    unique_weekdays = np.where(unique_valid, (unique_days.astype(np.int64) + 3) % 7, -1).astype(np.int8)
+    unique_week_starts = np.where(unique_valid,
+                                  unique_days - unique_weekdays.astype('timedelta64[D]'),
+                                  np.datetime64('NaT'))
+
+    df[DATE_COLUMN] = unique_dates[codes]
+    df[WEEKDAY_COLUMN] = unique_weekdays[codes]
+    df[WEEK_START_COLUMN] = unique_week_starts.astype('datetime64[ns]')[codes]
+    return df
+
+
+def map_unique(values, func, missing, dtype, memo=None):
+    """
+    按唯一值映射整列
+
+    把整列分解为编码和唯一值，每个唯一值只调用一次 func，再通过数组下标映射回各行，
+    缺失值映射为 missing。提供 memo 时 func 的结果在多次调用之间共用（超过 _MEMO_LIMIT 项时清空）。
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    if memo is not None and len(memo) > _MEMO_LIMIT:
+        memo.clear()
+
+    # 末尾一项对应缺失值（编码 -1）
+    lookup = np.full(len(uniques) + 1, missing, dtype=dtype)
+    for i, value in enumerate(uniques):
+        if memo is None:
+            lookup[i] = func(value)
+            continue
+        result = memo.get(value)
+        if result is None:
+            result = memo[value] = func(value)
+        lookup[i] = result
+    return lookup[codes]
+
+
+def parse_time_of_day(value):
+    """把单个打卡时间解析为当天的分钟数，无法解析时返回 MISSING_TIME"""
+    if isinstance(value, (datetime, time_of_day)):
+        return value.hour * 60 + value.minute
+    if pd.isna(value):
+        return MISSING_TIME
+
+    # "08:05"、"08:05:30"、"2025-09-01 08:05" 等格式取第一个 时:分
+    match = _TIME_PATTERN.search(str(value))
+    if match is None:
+        return MISSING_TIME
+    hour, minute = int(match.group(1)), int(match.group(2))
+    if hour > 23 or minute > 59:
+        return MISSING_TIME
+    return hour * 60 + minute
+
+
+def punch_minutes(values):
+    """批量把打卡时间转换为 int16 分钟数，每个不同的原始取值只解析一次"""
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        # 已经是分钟数（合并文件时缺少的列为 NaN）
+        return values.fillna(MISSING_TIME).to_numpy(dtype=np.int16)
+    return map_unique(values, parse_time_of_day, MISSING_TIME, np.int16, _time_memo)
+
+
+def compact_frame(df):
+    """
+    精简已标准化的考勤数据
+
+    只保留统计用到的列（COMPACT_COLUMNS 中存在的列），姓名、部门、考勤组、UserId 和打卡结果
+    转为分类类型，打卡时间转为 int16 分钟数。已精简的列保持不变，可重复调用。
+    """
+    df = df[[col for col in COMPACT_COLUMNS if col in df.columns]].copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    for col in PUNCH_TIME_COLUMNS:
+        if col in df.columns:
+            df[col] = punch_minutes(df[col])
+    return df
+
+
+def memory_usage(df):
+    """DataFrame 实际占用的字节数（包括字符串对象）"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def week_label(week_starts):
+    """由周一日期生成周标识（周一 至 周五）"""
+    fridays = week_starts + pd.Timedelta(days=4)
+    return week_starts.dt.strftime('%Y-%m-%d') + ' 至 ' + fridays.dt.strftime('%Y-%m-%d')
+
+
+def holiday_dates(special_holidays):
+    """把 YYYY-MM-DD 格式的特殊休息日转换为日期数组"""
+    dates = []
+    for date_str in special_holidays:
+        try:
+            dates.append(datetime.strptime(date_str, '%Y-%m-%d'))
+        except ValueError:
+            continue
+    return pd.to_datetime(pd.Series(dates, dtype=object)).to_numpy(dtype='datetime64[ns]')
+
+
+def check_punch_status(status):
+    """检查打卡状态"""
+    if pd.isna(status) or status == '' or status == '未打卡':
+        return '缺卡'
+
+    status = str(status).strip().lower()
+
+    # 包含"正常"字的都视为正常（适用于行政/后勤组规则）
+    if '正常' in status or ('管理员' in status and '改为正常' in status):
+        return '正常'
+    elif '补卡' in status:
+        return '补卡'
+    elif '请假' in status:
+        return '请假'
+    elif '严重迟到' in status:
+        return '严重迟到'
+    elif '缺卡' in status:
+        return '缺卡'
+    return status
+
+
+def classify_statuses(values):
+    """
+    批量分类打卡结果
+
+    每个不同的打卡结果只分类一次（结果记入备忘表），返回 int8 状态编码数组。
+    """
+    return map_unique(values, lambda value: STATUS_CODES.get(check_punch_status(value), STATUS_OTHER),
+                      STATUS_MISSING, np.int8, _status_memo)
+
+
+def resolve_group(value, group_rules, default_group):
+    """根据考勤组列的取值匹配已知考勤组，匹配不到时返回默认组"""
+    if pd.notna(value):
+        group = str(value).strip()
+        # 匹配到已知的组
+        for known_group in group_rules.keys():
+            if known_group in group:
+                return known_group
+
+    return default_group
+
+
+def resolve_group_codes(df, group_rules):
+    """
+    按唯一值解析考勤组
+
+    对 考勤组 列分解编码，每个不同取值只匹配一次已知考勤组，返回每行所属组在
+    group_rules 中的序号，未识别的为 -1。
+    """
+    if '考勤组' not in df.columns:
+        return np.full(len(df), -1, dtype=np.int16)
+
+    categories = list(group_rules)
+
+    def group_code(value):
+        group = resolve_group(value, group_rules, None)
+        return -1 if group is None else categories.index(group)
+
+    return map_unique(df['考勤组'], group_code, -1, np.int16)
+
+
+def resolve_groups(df, group_rules):
+    """考勤组解析结果保存为分类列 GROUP_COLUMN，供统计、检测和基本信息共用"""
+    df[GROUP_COLUMN] = pd.Categorical.from_codes(resolve_group_codes(df, group_rules),
+                                                 categories=list(group_rules))
+    return df
+
+
+def has_resolved_groups(df, group_rules):
+    """GROUP_COLUMN 是否存在且与当前规则的考勤组一致"""
+    return (GROUP_COLUMN in df.columns
+            and isinstance(df[GROUP_COLUMN].dtype, pd.CategoricalDtype)
+            and list(df[GROUP_COLUMN].cat.categories) == list(group_rules))
+
+
+def group_fallbacks(df, group_rules, fallback_group):
+    """
+    考勤组诊断表
+
+    列出无法匹配已知考勤组、统计时归入 fallback_group 的原始 考勤组 取值，
+    以及对应的记录数和人数。
+    """
+    if has_resolved_groups(df, group_rules):
+        unresolved = df[GROUP_COLUMN].isna().to_numpy()
+    else:
+        unresolved = resolve_group_codes(df, group_rules) < 0
+    if not unresolved.any():
+        return pd.DataFrame(columns=DIAGNOSTIC_COLUMNS)
+
+    raw_groups = df['考勤组'] if '考勤组' in df.columns else pd.Series([None] * len(df), index=df.index)
+    names = df['姓名'] if '姓名' in df.columns else pd.Series([''] * len(df), index=df.index)
+    table = pd.DataFrame({
+        '原始考勤组': raw_groups[unresolved].astype(object).fillna('（空）').to_numpy(),
+        '姓名': names[unresolved].to_numpy(dtype=object),
+    }).groupby('原始考勤组', sort=False).agg(
+        记录数=('姓名', 'size'),
+        人数=('姓名', 'nunique'),
+    ).reset_index()
+    table['归入考勤组'] = fallback_group
+    return table[DIAGNOSTIC_COLUMNS]
+
+
+def result_columns(rule):
+    """获取规则中参与判定的打卡结果列"""
+    return [col for col in rule['punch_columns'] if col.endswith('结果')]
+
+
+def time_thresholds(rule):
+    """
+    按打卡时间判定时使用的时限
+
+    返回 (打卡时间列, 时限分钟数数组, 是否为上班打卡的布尔数组)；上班打卡晚于时限为迟到，
+    下班打卡早于时限为早退。打卡时间列与 result_columns 按顺序一一对应（由 check_rule 检查）。
+    """
+    columns = [col for col in rule['punch_columns'] if col.endswith('时间')]
+    limits = np.array([parse_time_of_day(value) for value in rule['punch_times']], dtype=np.int64)
+    starts = np.array([col.startswith('上班') for col in columns])
+    return columns, limits, starts
+
+
+def apply_time_rules(statuses, minutes, limits, starts):
+    """
+    按打卡时间重新判定打卡状态（行 × 打卡次数）
+
+    补卡和请假沿用打卡结果；其余打卡没有时间记为缺卡，超出时限记为严重迟到，否则为正常。
+    返回 (状态编码, 每行迟到早退分钟数)。
+    """
+    deviation = np.where(starts, minutes - limits, limits - minutes)
+    missing = minutes == MISSING_TIME
+    excused = (statuses == STATUS_MAKEUP) | (statuses == STATUS_LEAVE)
+
+    timed = np.where(missing, STATUS_MISSING, np.where(deviation > 0, STATUS_SEVERE_LATE, STATUS_NORMAL))
+    statuses = np.where(excused, statuses, timed).astype(np.int8)
+    late_minutes = np.where(excused | missing, 0, np.clip(deviation, 0, None)).sum(axis=1)
+    return statuses, late_minutes
+
+
+def selected_groups(group_rules, group, default_group=None):
+    """
+    解析统计范围
+
+    返回 (参与统计的考勤组列表, 未识别考勤组时使用的组)。统计单个组时未识别的记录
+    归入该组；统计全部考勤组时归入 default_group（默认为第一个组）。
+    """
+    if group == ALL_GROUPS:
+        return list(group_rules), default_group or next(iter(group_rules))
+    return [group], group
+
+
+def classify_daily(df, group_rules, group, special_holidays=(), default_group=None,
+                   punch_mode=EVALUATE_BY_RESULT):
+    """
+    逐日分类（列运算）
+
+    group 为 ALL_GROUPS 时一次完成所有考勤组，每行按自己的考勤组规则判定。
+    返回只保留参与统计且日期有效的行的 DataFrame，包含 姓名/部门/考勤组/日期值/周起始
+    以及当天的 实际打卡/正常次数/迟到次数/旷工次数。punch_mode 为 EVALUATE_BY_TIME 时
+    按打卡时间和规则中的 punch_times 重新判定，并追加 迟到早退分钟 列。
+    """
+    groups_selected, fallback_group = selected_groups(group_rules, group, default_group)
+    n = len(df)
+
+    names = df['姓名'] if '姓名' in df.columns else pd.Series([''] * n, index=df.index)
+    departments = df['部门'] if '部门' in df.columns else pd.Series([''] * n, index=df.index)
+
+    # 读取标准化后的日期列，未标准化时先补算
+    if DATE_COLUMN not in df.columns:
+        df = normalize_dates(df.copy())
+    dates = df[DATE_COLUMN]
+    weekday = df[WEEKDAY_COLUMN].to_numpy()
+
+    # 考勤组：读取已解析的分类列，未识别的归入 fallback_group
+    categories = list(group_rules)
+    if has_resolved_groups(df, group_rules):
+        group_codes = df[GROUP_COLUMN].cat.codes.to_numpy()
+    else:
+        group_codes = resolve_group_codes(df, group_rules)
+    group_codes = np.where(group_codes < 0, categories.index(fallback_group), group_codes)
+    groups = np.array(categories, dtype=object)[group_codes]
+
+    valid = ((dates.notna() & names.notna() & (names != '姓名')).to_numpy()
+             & np.isin(group_codes, [categories.index(name) for name in groups_selected]))
+    is_rest = dates.isin(holiday_dates(special_holidays)).to_numpy() | (weekday >= 5)
+
+    total_punches = np.zeros(n, dtype=np.int64)
+    normal_count = np.zeros(n, dtype=np.int64)
+    late_count = np.zeros(n, dtype=np.int64)
+    absent_count = np.zeros(n, dtype=np.int64)
+    by_time = punch_mode == EVALUATE_BY_TIME
+    late_minutes = np.zeros(n, dtype=np.int64)
+
+    # 每个打卡结果列只分类一次、每个打卡时间列只解析一次，各考勤组共用
+    column_statuses = {}
+    column_minutes = {}
+    for group_name in groups_selected:
+        in_group = valid & (group_codes == categories.index(group_name))
+        if not in_group.any():
+            continue
+
+        # 打卡结果分类：组内行 × k 次打卡的状态编码
+        rule = group_rules[group_name]
+        columns = result_columns(rule)
+        statuses = np.full((int(in_group.sum()), len(columns)), STATUS_MISSING, dtype=np.int8)
+        for j, col in enumerate(columns):
+            if col in df.columns:
+                if col not in column_statuses:
+                    column_statuses[col] = classify_statuses(df[col])
+                statuses[:, j] = column_statuses[col][in_group]
+
+        # 按打卡时间重新判定
+        rest = is_rest[in_group]
+        if by_time:
+            if not rule.get('punch_times'):
+                raise ValueError(f"考勤组 {group_name} 没有配置打卡时限（punch_times），无法按打卡时间判定")
+            time_columns, limits, starts = time_thresholds(rule)
+            minutes = np.full(statuses.shape, MISSING_TIME, dtype=np.int64)
+            for j, col in enumerate(time_columns):
+                if col in df.columns:
+                    if col not in column_minutes:
+                        column_minutes[col] = punch_minutes(df[col])
+                    minutes[:, j] = column_minutes[col][in_group]
+            statuses, minutes_late = apply_time_rules(statuses, minutes, limits, starts)
+            late_minutes[in_group] = np.where(rest, 0, minutes_late)
+
+        evaluator = rule.get('evaluator') or PunchEvaluator(rule)
+        normal, late, absent = evaluator(statuses)
+
+        # 特殊休息日和周末按全勤处理
+        daily = rule['daily_punches']
+        total_punches[in_group] = np.where(rest, daily, len(columns))
+        normal_count[in_group] = np.where(rest, daily, normal)
+        late_count[in_group] = np.where(rest, 0, late)
+        absent_count[in_group] = np.where(rest, 0, absent)
+
+    result = pd.DataFrame({
+        '姓名': names.to_numpy(dtype=object),
+        '部门': departments.to_numpy(dtype=object),
+        '考勤组': groups,
+        DATE_COLUMN: dates.to_numpy(),
+        WEEK_START_COLUMN: df[WEEK_START_COLUMN].to_numpy(),
+        '实际打卡': total_punches,
+        '正常次数': normal_count,
+        '迟到次数': late_count,
+        '旷工次数': absent_count,
+    })
+    if by_time:
+        result[LATE_MINUTES_COLUMN] = late_minutes
+    return result[valid].reset_index(drop=True)
+
+
+def aggregate_weekly(daily, group_rules):
+    """
+    按(员工, 周)聚合每日结果并计算周结果
+
+    结果顺序与逐行累加时一致：员工按首次出现排序，同一员工的周按首次出现排序；
+    部门取该员工该周最后一条记录。
+    """
+    if daily.empty:
+        return pd.DataFrame(columns=WEEKLY_COLUMNS)
+    with attendance_profiler.phase('按周汇总', len(daily)):
+        totals, _ = weekly_totals(daily)
+    with attendance_profiler.phase('周结果判定', len(totals)):
+        return finish_weekly(totals, group_rules)
+
+
+def weekly_totals(daily):
+    """
+    按(员工, 周)累加每日计数
+
+    返回 (周汇总表, 每条日记录所在的周汇总行号)，周汇总表只含原始累加值，
+    周结果由 finish_weekly 计算。
+    """
+    daily = daily.assign(_pos=np.arange(len(daily)),
+                         _name_order=pd.factorize(daily['姓名'])[0])
+    grouped = daily.groupby(['姓名', '考勤组', WEEK_START_COLUMN], sort=False)
+    sums = {col: (col, 'sum') for col in count_columns(daily)}
+    totals = grouped.agg(
+        **sums,
+        _name_order=('_name_order', 'first'),
+        _first=('_pos', 'min'),
+        _last=('_pos', 'max'),
+    ).reset_index()
+    totals = totals.sort_values(['_name_order', '_first'], kind='stable')
+
+    # 分组编号 -> 排序后的行号
+    positions = np.empty(len(totals), dtype=np.int64)
+    positions[totals.index.to_numpy()] = np.arange(len(totals))
+    rows = positions[grouped.ngroup().to_numpy()]
+
+    totals = totals.reset_index(drop=True)
+    totals['部门'] = daily['部门'].to_numpy(dtype=object)[totals['_last'].to_numpy()]
+    totals['周期'] = week_label(totals[WEEK_START_COLUMN])
+    return totals, rows
+
+
+def finish_weekly(weekly, group_rules):
+    """由周累加值计算应打卡、缺失补正和周结果"""
+    weekly = weekly.copy()
+
+    # 打卡次数少于预期时，缺失的视为正常
+    expected = weekly['考勤组'].map(lambda g: group_rules[g]['weekly_punches']).astype(np.int64)
+    shortfall = (expected - weekly['实际打卡']).clip(lower=0)
+    weekly['应打卡'] = expected
+    weekly['正常次数'] = weekly['正常次数'] + shortfall
+    weekly['实际打卡'] = weekly['实际打卡'] + shortfall
+
+    # 判断周结果
+    weekly['周结果'] = np.select(
+        [weekly['正常次数'] >= expected, weekly['旷工次数'] > 0, weekly['迟到次数'] > 0],
+        ['正常',
+         '旷工' + weekly['旷工次数'].astype(str) + '次',
+         '迟到' + weekly['迟到次数'].astype(str) + '次'],
+        default='异常' + (expected - weekly['正常次数']).astype(str) + '次',
+    )
+
+    return weekly[weekly_columns(weekly)]
+
+
+def count_columns(frame):
+    """逐日结果或周汇总中需要累加的列（按打卡时间判定时包括迟到早退分钟）"""
+    if LATE_MINUTES_COLUMN in frame.columns:
+        return DAILY_COUNT_COLUMNS + [LATE_MINUTES_COLUMN]
+    return DAILY_COUNT_COLUMNS
+
+
+def weekly_columns(frame):
+    """周统计结果的列（按打卡时间判定时在末尾追加迟到早退分钟）"""
+    if LATE_MINUTES_COLUMN in frame.columns:
+        return WEEKLY_COLUMNS + [LATE_MINUTES_COLUMN]
+    return WEEKLY_COLUMNS
+
+
+class WeeklyResults:
+    """
+    周统计结果模型
+
+    以带类型的 DataFrame 保存周统计结果（计数列为整数），
+    结果表格、统计信息和导出都从这里读取。
+    """
+
+    COUNT_COLUMNS = ['应打卡', '实际打卡', '正常次数', '迟到次数', '旷工次数']
+
+    def __init__(self, weekly=None, group='', diagnostics=None):
+        if weekly is None:
+            weekly = pd.DataFrame(columns=WEEKLY_COLUMNS)
+        if diagnostics is None:
+            diagnostics = pd.DataFrame(columns=DIAGNOSTIC_COLUMNS)
+        columns = weekly_columns(weekly)
+        counts = self.COUNT_COLUMNS + columns[len(WEEKLY_COLUMNS):]
+        self.weekly = weekly[columns].astype({col: np.int64 for col in counts})
+        self.group = group
+        self.diagnostics = diagnostics  # 未识别考勤组的诊断表
+
+    def __len__(self):
+        return len(self.weekly)
+
+    def patch(self, rows, weekly):
+        """用 weekly 中对应行改写指定的周统计行（增量统计后使用）"""
+        for col in self.weekly.columns:
+            self.weekly.iloc[rows, self.weekly.columns.get_loc(col)] = weekly[col].to_numpy()[rows]
+
+    @property
+    def empty(self):
+        return self.weekly.empty
+
+    def status_masks(self):
+        """按周结果分类，返回 (正常, 迟到, 旷工) 三个布尔列，与周结果文字一致"""
+        normal = self.weekly['正常次数'] >= self.weekly['应打卡']
+        absent = ~normal & (self.weekly['旷工次数'] > 0)
+        late = ~normal & ~absent & (self.weekly['迟到次数'] > 0)
+        return normal, late, absent
+
+    def person_summary(self):
+        """
+        个人汇总
+
+        一次 groupby 统计每人的统计周数、正常/迟到/旷工周数和正常率，
+        部门和考勤组取该员工的第一条周记录，人员按首次出现排序。
+        按打卡时间判定的结果另外汇总迟到早退分钟。
+        """
+        extra = self.weekly.columns[len(WEEKLY_COLUMNS):].tolist()
+        if self.weekly.empty:
+            # 列类型与有数据时一致：计数为 int64，正常率为文字
+            summary = pd.DataFrame({col: pd.Series(dtype=object) for col in ['姓名', '部门', '考勤组']})
+            for col in ['统计周数', '正常周数', '迟到周数', '旷工周数'] + extra:
+                summary[col] = pd.Series(dtype=np.int64)
+            summary['正常率'] = pd.Series(dtype=object)
+            return summary[SUMMARY_COLUMNS + extra]
+
+        normal, late, absent = self.status_masks()
+        summary = self.weekly[['姓名'] + extra].assign(
+            _pos=np.arange(len(self.weekly)), _normal=normal, _late=late, _absent=absent
+        ).groupby('姓名', sort=False).agg(
+            统计周数=('_pos', 'size'),
+            正常周数=('_normal', 'sum'),
+            迟到周数=('_late', 'sum'),
+            旷工周数=('_absent', 'sum'),
+            _first=('_pos', 'min'),
+            **{col: (col, 'sum') for col in extra},
+        ).reset_index()
+
+        first_rows = summary['_first'].to_numpy()
+        summary['部门'] = self.weekly['部门'].to_numpy(dtype=object)[first_rows]
+        summary['考勤组'] = self.weekly['考勤组'].to_numpy(dtype=object)[first_rows]
+        rates = summary['正常周数'] / summary['统计周数'] * 100
+        summary['正常率'] = rates.map('{:.1f}%'.format)
+        return summary[SUMMARY_COLUMNS + extra]
+
+    def counts(self):
+        """统计总周数以及正常、迟到、旷工的周数"""
+        normal, late, absent = self.status_masks()
+        return {
+            'total': len(self.weekly),
+            'normal': int(normal.sum()),
+            'late': int(late.sum()),
+            'absent': int(absent.sum()),
+        }
+
+
+def analyze(df, group_rules, group, special_holidays=(), progress=None,
+            chunk_rows=ANALYSIS_CHUNK_ROWS, default_group=None, punch_mode=EVALUATE_BY_RESULT):
+    """
+    统计指定考勤组的周考勤结果
+
+    group 为 ALL_GROUPS 时一次扫描统计所有考勤组，结果的 考勤组 列区分各组，
+    未识别考勤组的记录归入 default_group。按 chunk_rows 行分块完成逐日分类，每块结束后调用 progress(已处理行数, 总行数)，
+    回调中抛出 AnalysisCancelled 即可中止统计。punch_mode 见 classify_daily。
+    """
+    daily = classify_chunks(df, group_rules, group, special_holidays, progress, chunk_rows, default_group,
+                            punch_mode)
+    return aggregate_weekly(daily, group_rules)
+
+
+def classify_chunks(df, group_rules, group, special_holidays=(), progress=None,
+                    chunk_rows=ANALYSIS_CHUNK_ROWS, default_group=None, punch_mode=EVALUATE_BY_RESULT):
+    """按 chunk_rows 行分块完成逐日分类，返回合并后的逐日结果"""
+    if DATE_COLUMN not in df.columns:
+        df = normalize_dates(df.copy())
+    if not has_resolved_groups(df, group_rules):
+        df = resolve_groups(df.copy(), group_rules)
+
+    total_rows = len(df)
+    parts = []
+    for start in range(0, total_rows, chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        with attendance_profiler.phase('打卡分类', len(chunk)):
+            parts.append(classify_daily(chunk, group_rules, group, special_holidays, default_group, punch_mode))
+        if progress is not None:
+            progress(min(start + chunk_rows, total_rows), total_rows)
+
+    if parts:
+        return pd.concat(parts, ignore_index=True)
+    return classify_daily(df, group_rules, group, special_holidays, default_group, punch_mode)
+
+
+class IncrementalAnalysis:
+    """
+    可增量更新的周统计
+
+    累加器按整数编号保存：员工（姓名 + 考勤组）和部门的文字各只存一份，
+    每个(员工, 周)只占 NumPy 数组中的一行，每条(员工, 日)记录只保存日期、工作日计数和所在周的编号。
+    特殊休息日变化时只重算涉及日期的记录，把差值累加到所在的周并重新判定这些周；
+    追加新的导出文件时只分类新记录并累加到对应的周，已导入的 (UserId, 日期) 自动跳过。
+    状态可以用 save / load 保存到磁盘，供下一次追加使用。
+    """
+
+    def __init__(self, df, group_rules, group, special_holidays=(), progress=None,
+                 chunk_rows=ANALYSIS_CHUNK_ROWS, default_group=None, punch_mode=EVALUATE_BY_RESULT):
+        self.version = STATE_VERSION
+        self.group_rules = group_rules
+        self.group = group
+        self.default_group = default_group
+        self.punch_mode = punch_mode
+        self.count_columns = DAILY_COUNT_COLUMNS.copy()
+        if punch_mode == EVALUATE_BY_TIME:
+            self.count_columns.append(LATE_MINUTES_COLUMN)
+        self.holidays = np.unique(holiday_dates(special_holidays).astype('datetime64[D]'))
+
+        # 逐日记录：日期（天数）、按工作日的计数、所在周的编号
+        self.record_days = np.zeros(0, dtype=np.int32)
+        self.record_counts = np.zeros((0, len(self.count_columns)), dtype=np.int16)
+        self.record_weeks = np.zeros(0, dtype=np.int32)
+        self.seen = set()  # 已导入记录的 (UserId 编号, 日期) 整数键
+        self.user_codes = {}  # UserId -> 编号
+
+        # 员工（姓名 + 考勤组）和部门，文字只存一份
+        self.employee_ids = {}  # (姓名, 考勤组) -> 员工编号
+        self.employee_names = []
+        self.employee_groups = []
+        self.employee_order = np.zeros(0, dtype=np.int32)  # 姓名首次出现的顺序
+        self.employee_daily_punches = np.zeros(0, dtype=np.int8)
+        self.name_order = {}  # 姓名 -> 首次出现顺序
+        self.departments = [np.nan]  # 编号 0 为缺失的部门
+        self.department_codes = {}
+
+        # 每个(员工, 周)一行的累加器
+        self.week_ids = {}  # (员工编号, 周起始天数) -> 周编号
+        self.week_employee = np.zeros(0, dtype=np.int32)
+        self.week_start = np.zeros(0, dtype=np.int32)
+        self.week_department = np.zeros(0, dtype=np.int32)  # 该周最后一条记录的部门
+        self.week_first = np.zeros(0, dtype=np.int64)  # 该周第一条记录的位置，用于排序
+        self.week_counts = np.zeros((0, len(self.count_columns)), dtype=np.int64)
+
+        # 按周编号保存的周结果；weekly 为按显示顺序排列的周结果
+        self.finished = pd.DataFrame(columns=WEEKLY_COLUMNS)
+        self.display = np.zeros(0, dtype=np.int64)  # 周编号 -> weekly 中的行号
+        self.weekly = pd.DataFrame(columns=WEEKLY_COLUMNS + self.count_columns[len(DAILY_COUNT_COLUMNS):])
+
+        self.append(df, progress, chunk_rows)
+
+    def new_records(self, df):
+        """
+        标记尚未导入的记录，并把它们的 (UserId, 日期) 记入已导入集合
+
+        只跳过之前的批次已导入的键；同一批内重复的记录与 analyze() 一样全部统计
+        （多个文件之间的重复记录合并时已由 drop_duplicate_punches 去掉）。
+        """
+        if 'UserId' not in df.columns:
+            return np.ones(len(df), dtype=bool)
+
+        has_key = (df['UserId'].notna() & df[DATE_COLUMN].notna()).to_numpy()
+        new = ~has_key
+        rows = np.flatnonzero(has_key)
+        if rows.size == 0:
+            return new
+
+        # 键 = UserId 编号 << 21 | 日期天数
+        codes, uniques = pd.factorize(df['UserId'].to_numpy(dtype=object)[rows])
+        user_codes = np.array([self.user_codes.setdefault(str(value), len(self.user_codes))
+                               for value in uniques], dtype=np.int64)
+        days = df[DATE_COLUMN].to_numpy()[rows].astype('datetime64[D]').astype(np.int64)
+        keys = (user_codes[codes] << 21) | days
+
+        unseen = np.fromiter((key not in self.seen for key in keys.tolist()), dtype=bool, count=len(keys))
+        self.seen.update(keys[unseen].tolist())
+        new[rows[unseen]] = True
+        return new
+
+    def append(self, df, progress=None, chunk_rows=ANALYSIS_CHUNK_ROWS):
+        """
+        追加新的考勤记录
+
+        只分类新记录并累加到对应的周，返回 (新增记录数, 跳过的重复记录数)。
+        """
+        if DATE_COLUMN not in df.columns:
+            df = normalize_dates(df.copy())
+        if not has_resolved_groups(df, self.group_rules):
+            df = resolve_groups(df.copy(), self.group_rules)
+
+        new = self.new_records(df)
+        skipped = int((~new).sum())
+        if skipped:
+            df = df[new]
+
+        # 不含特殊休息日的逐日结果（周末已按休息日处理）
+        daily = classify_chunks(df, self.group_rules, self.group, (), progress, chunk_rows, self.default_group,
+                                self.punch_mode)
+        if daily.empty:
+            return 0, skipped
+
+        days = daily[DATE_COLUMN].to_numpy().astype('datetime64[D]').astype(np.int32)
+        record_counts = daily[self.count_columns].to_numpy(dtype=np.int16)
+
+        # 按当前的特殊休息日累加到新记录所在的周
+        daily_punches = daily['考勤组'].map(lambda g: self.group_rules[g]['daily_punches']).to_numpy(dtype=np.int64)
+        on_holiday = np.isin(days, self.holidays.astype(np.int64))
+        daily.loc[on_holiday, self.count_columns] = self.rest_counts(daily_punches[on_holiday])
+        with attendance_profiler.phase('按周汇总', len(daily)):
+            local, local_rows = weekly_totals(daily)
+        with attendance_profiler.phase('累加到周', len(local)):
+            ids = self.accumulate(daily, local, local_rows, days, record_counts)
+
+        self.refresh(np.unique(ids))
+        return len(daily), skipped
+
+    def accumulate(self, daily, local, local_rows, days, record_counts):
+        """把一批记录的周汇总累加到累加器，返回各周汇总行的周编号"""
+        # 员工和部门编号
+        for name in pd.unique(daily['姓名']):
+            self.name_order.setdefault(name, len(self.name_order))
+        employees = np.array([self.employee_id(name, group)
+                              for name, group in zip(local['姓名'], local['考勤组'])], dtype=np.int32)
+        department_codes, department_values = pd.factorize(local['部门'].to_numpy(dtype=object))
+        # 缺失的部门（编码 -1）取末尾的 0
+        department_lookup = np.array([self.department_code(value) for value in department_values] + [0],
+                                     dtype=np.int32)
+        departments = department_lookup[department_codes]
+
+        # 周编号：已有的周累加计数并更新部门，新的周追加到累加器末尾
+        week_starts = local[WEEK_START_COLUMN].to_numpy().astype('datetime64[D]').astype(np.int32)
+        week_count = len(self.week_employee)
+        ids = np.array([self.week_ids.setdefault(key, len(self.week_ids))
+                        for key in zip(employees.tolist(), week_starts.tolist())], dtype=np.int32)
+        existing = ids < week_count
+        counts = local[self.count_columns].to_numpy(dtype=np.int64)
+
+        self.week_counts[ids[existing]] += counts[existing]
+        self.week_department[ids[existing]] = departments[existing]
+        added = ~existing
+        self.week_employee = np.concatenate([self.week_employee, employees[added]])
+        self.week_start = np.concatenate([self.week_start, week_starts[added]])
+        self.week_department = np.concatenate([self.week_department, departments[added]])
+        self.week_first = np.concatenate([self.week_first,
+                                          local['_first'].to_numpy()[added] + len(self.record_days)])
+        self.week_counts = np.concatenate([self.week_counts, counts[added]])
+
+        self.record_days = np.concatenate([self.record_days, days])
+        self.record_counts = np.concatenate([self.record_counts, record_counts])
+        self.record_weeks = np.concatenate([self.record_weeks, ids[local_rows]])
+        return ids
+
+    def employee_id(self, name, group):
+        """员工编号，新员工追加到员工表"""
+        key = (name, group)
+        employee = self.employee_ids.get(key)
+        if employee is None:
+            employee = self.employee_ids[key] = len(self.employee_names)
+            self.employee_names.append(name)
+            self.employee_groups.append(group)
+            self.employee_order = np.append(self.employee_order, np.int32(self.name_order[name]))
+            self.employee_daily_punches = np.append(self.employee_daily_punches,
+                                                    np.int8(self.group_rules[group]['daily_punches']))
+        return employee
+
+    def department_code(self, department):
+        """部门编号，新部门追加到部门表"""
+        code = self.department_codes.get(department)
+        if code is None:
+            code = self.department_codes[department] = len(self.departments)
+            self.departments.append(department)
+        return code
+
+    def rest_counts(self, daily_punches):
+        """休息日按全勤处理：实际打卡和正常次数为每日应打卡次数，其余计数为0"""
+        counts = np.zeros((len(daily_punches), len(self.count_columns)), dtype=np.int64)
+        counts[:, 0] = daily_punches
+        counts[:, 1] = daily_punches
+        return counts
+
+    def update(self, special_holidays):
+        """
+        切换到新的特殊休息日集合
+
+        只重算新增或移除的休息日所在的记录和周，返回被改写的周统计行号。
+        """
+        holidays = np.unique(holiday_dates(special_holidays).astype('datetime64[D]'))
+        changed = np.setxor1d(holidays, self.holidays)
+        self.holidays = holidays
+        if changed.size == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        affected = np.flatnonzero(np.isin(self.record_days, changed.astype(np.int64)))
+        if affected.size == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # 设为休息日的记录加上 (休息日 - 工作日) 的差值，取消的记录减去差值
+        weeks = self.record_weeks[affected]
+        daily_punches = self.employee_daily_punches[self.week_employee[weeks]].astype(np.int64)
+        delta = self.rest_counts(daily_punches) - self.record_counts[affected]
+        sign = np.where(np.isin(self.record_days[affected], holidays.astype(np.int64)), 1, -1)
+        np.add.at(self.week_counts, weeks, delta * sign[:, None])
+
+        return self.refresh(np.unique(weeks))
+
+    def daily_frame(self):
+        """
+        逐日明细：每条已统计的 (员工, 日) 记录一行
+
+        计数已按当前的特殊休息日处理，部门取所在周的部门。文字列为分类类型，日期为 datetime64。
+        """
+        weeks = self.record_weeks
+        employees = self.week_employee[weeks]
+        counts = self.record_counts.astype(np.int64)
+        on_holiday = np.isin(self.record_days, self.holidays.astype(np.int64))
+        counts[on_holiday] = self.rest_counts(self.employee_daily_punches[employees[on_holiday]].astype(np.int64))
+
+        frame = pd.DataFrame({
+            '姓名': pd.Categorical(np.array(self.employee_names, dtype=object)[employees]),
+            '部门': pd.Categorical(np.array(self.departments, dtype=object)[self.week_department[weeks]]),
+            '考勤组': pd.Categorical(np.array(self.employee_groups, dtype=object)[employees],
+                                  categories=list(self.group_rules)),
+            '日期': self.record_days.astype('datetime64[D]').astype('datetime64[ns]'),
+            WEEK_START_COLUMN: self.week_start[weeks].astype('datetime64[D]').astype('datetime64[ns]'),
+            '特殊休息日': on_holiday,
+        })
+        frame[self.count_columns] = counts
+        return frame
+
+    def week_frame(self, ids):
+        """由累加器生成指定周的汇总表（周结果由 finish_weekly 计算）"""
+        employees = self.week_employee[ids]
+        week_starts = pd.Series(self.week_start[ids].astype('datetime64[D]').astype('datetime64[ns]'))
+        frame = pd.DataFrame({
+            '姓名': np.array(self.employee_names, dtype=object)[employees],
+            '部门': np.array(self.departments, dtype=object)[self.week_department[ids]],
+            '考勤组': np.array(self.employee_groups, dtype=object)[employees],
+            '周期': week_label(week_starts).to_numpy(dtype=object),
+        })
+        frame[self.count_columns] = self.week_counts[ids]
+        return frame
+
+    def refresh(self, ids):
+        """重新判定指定编号的周，有新的周时重新排列 weekly，返回这些周在 weekly 中的行号"""
+        with attendance_profiler.phase('周结果判定', len(ids)):
+            patched = finish_weekly(self.week_frame(ids), self.group_rules)
+        week_count = len(self.finished)
+        existing = ids < week_count
+        if existing.any():
+            for col in patched.columns:
+                self.finished.iloc[ids[existing], self.finished.columns.get_loc(col)] = \
+                    patched.loc[existing, col].to_numpy()
+
+        if existing.all():
+            rows = self.display[ids]
+            for col in patched.columns:
+                self.weekly.iloc[rows, self.weekly.columns.get_loc(col)] = patched[col].to_numpy()
+            return rows
+
+        # 新的周排在同一员工已有的周之后，员工按首次出现排序
+        finished = patched[~existing].reset_index(drop=True)
+        self.finished = finished if self.finished.empty else pd.concat([self.finished, finished], ignore_index=True)
+        order = np.lexsort((self.week_first, self.employee_order[self.week_employee]))
+        self.display = np.empty(len(order), dtype=np.int64)
+        self.display[order] = np.arange(len(order))
+        self.weekly = self.finished.iloc[order].reset_index(drop=True)
+        return self.display[ids]
+
+    def save(self, file_path):
+        """保存统计状态"""
+        temp_path = file_path + '.tmp'
+        pd.to_pickle(self, temp_path)
+        os.replace(temp_path, file_path)
+
+    @staticmethod
+    def load(file_path):
+        """读取 save 保存的统计状态"""
+        state = pd.read_pickle(file_path)
+        if not isinstance(state, IncrementalAnalysis) or getattr(state, 'version', None) != STATE_VERSION:
+            raise ValueError(f"不支持的统计状态文件: {file_path}")
+        return state
+
+
+def header_cells(sheet, columns):
+    """表头单元格，样式与 DataFrame.to_excel 的表头一致（加粗、细边框、居中）"""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    side = Side(style='thin')
+    cells = []
+    for column in columns:
+        cell = WriteOnlyCell(sheet, value=str(column))
+        cell.font = Font(bold=True)
+        cell.border = Border(left=side, right=side, top=side, bottom=side)
+        cell.alignment = Alignment(horizontal='center', vertical='top')
+        cells.append(cell)
+    return cells
+
+
+def write_sheet(workbook, title, frame, progress=None, done=0, total=0, header=True,
+                chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    把 DataFrame 流式写入只写工作簿的一个工作表
+
+    每次只把 chunk_rows 行转换为 Python 值写出（缺失值写为空单元格），写完一块调用
+    progress(done + 已写行数, total)。返回写入后的 done。
+    """
+    sheet = workbook.create_sheet(title)
+    if header:
+        sheet.append(header_cells(sheet, frame.columns))
+
+    for start in range(0, len(frame), chunk_rows):
+        chunk = frame.iloc[start:start + chunk_rows].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            sheet.append(row)
+        if progress is not None:
+            progress(done + start + len(chunk), total)
+    return done + len(frame)
+
+
+def companion_path(file_path, suffix):
+    """同目录下的附属文件路径，例如 考勤统计.csv -> 考勤统计_汇总.csv"""
+    stem, ext = os.path.splitext(file_path)
+    return f"{stem}_{suffix}{ext}"
+
+
+def columnar_categories(frame):
+    """
+    文字列转为分类类型，分类取值为字符串
+
+    没有数据时 object 类型的列在文件中没有类型，取值为字符串的分类保证空结果与有数据时列类型一致。
+    """
+    frame = frame.reset_index(drop=True)
+    for col in COLUMNAR_CATEGORY_COLUMNS:
+        if col in frame.columns:
+            values = frame[col].astype('category')
+            frame[col] = values.cat.set_categories(values.cat.categories.astype(str).astype('string'))
+    return frame
+
+
+def columnar_weekly(weekly):
+    """列式导出的周统计明细：文字列转为分类，由 周期 拆出 周起始 日期"""
+    frame = weekly.reset_index(drop=True)
+    frame.insert(frame.columns.get_loc('周期') + 1, WEEK_START_COLUMN,
+                 pd.to_datetime(frame['周期'].astype(str).str[:10], format='%Y-%m-%d'))
+    return columnar_categories(frame)
+
+
+def columnar_summary(summary):
+    """列式导出的个人汇总：正常率转为百分数（float），文字列转为分类"""
+    frame = summary.reset_index(drop=True)
+    frame['正常率'] = pd.to_numeric(frame['正常率'].astype(str).str.rstrip('%'),
+                                 errors='coerce').astype(np.float64)
+    return columnar_categories(frame)
+
+
+def write_columnar(frame, file_path):
+    """
+    按扩展名写 Parquet 或 Feather
+
+    Feather 不压缩，可用 pyarrow.feather.read_table(memory_map=True) 直接映射读取。
+    """
+    fmt = COLUMNAR_FORMATS[os.path.splitext(file_path)[1].lower()]
+    try:
+        if fmt == 'Feather':
+            frame.to_feather(file_path, compression='uncompressed')
+        else:
+            frame.to_parquet(file_path, index=False)
+    except ImportError as e:
+        raise ValueError(f"导出 {fmt} 需要安装 pyarrow（pip install pyarrow）: {e}") from e
+
+
+def write_results(results, file_path, progress=None, log=_no_log, group_rules=None, daily=None):
+    """
+    导出统计结果
+
+    .csv 文件写周统计明细，个人汇总另存为 *_汇总.csv；.parquet / .feather 同样分为两个文件，
+    列保留类型（分类、日期、整数），提供 daily（IncrementalAnalysis.daily_frame）时另存 *_逐日明细；
+    其他扩展名写 Excel，包含 周统计明细、个人汇总 和 考勤规则 三个工作表，用只写工作簿按块流式写出，
+    内存占用与结果行数基本无关。各阶段耗时写入日志。Excel 的考勤规则说明未指定 group_rules 时使用默认规则。
+    """
+    result_df = results.weekly
+    timings = {}
+
+    # 个人汇总
+    with attendance_profiler.phase('个人汇总', len(result_df)) as step:
+        summary_df = results.person_summary()
+    timings['个人汇总'] = step.seconds
+
+    total_rows = len(result_df) + len(summary_df)
+    extension = os.path.splitext(file_path)[1].lower()
+
+    # 根据文件扩展名保存
+    if extension == '.csv':
+        with attendance_profiler.phase('写入CSV', len(result_df)) as step:
+            result_df.to_csv(file_path, index=False, encoding='utf-8-sig')
+        timings['周统计明细'] = step.seconds
+        if progress is not None:
+            progress(len(result_df), total_rows)
+        # CSV保存汇总到另一个文件
+        with attendance_profiler.phase('写入汇总CSV', len(summary_df)) as step:
+            summary_path = companion_path(file_path, '汇总')
+            summary_df.to_csv(summary_path, index=False, encoding='utf-8-sig')
+        timings['汇总文件'] = step.seconds
+        log(f"汇总已导出到: {os.path.basename(summary_path)}")
+    elif extension in COLUMNAR_FORMATS:
+        tables = [('周统计明细', file_path, columnar_weekly(result_df)),
+                  ('个人汇总', companion_path(file_path, '汇总'), columnar_summary(summary_df))]
+        if daily is not None:
+            tables.append(('逐日明细', companion_path(file_path, '逐日明细'), columnar_categories(daily)))
+            total_rows += len(daily)
+
+        done = 0
+        for name, path, frame in tables:
+            with attendance_profiler.phase(f"写入{COLUMNAR_FORMATS[extension]}", len(frame)) as step:
+                write_columnar(frame, path)
+            timings[name] = step.seconds
+            done += len(frame)
+            if progress is not None:
+                progress(done, total_rows)
+            if path != file_path:
+                log(f"{name}已导出到: {os.path.basename(path)}")
+    else:
+        from openpyxl import Workbook
+
+        with attendance_profiler.phase('写入Excel', total_rows):
+            workbook = Workbook(write_only=True)
+            with attendance_profiler.phase('周统计明细', len(result_df)) as step:
+                done = write_sheet(workbook, '周统计明细', result_df, progress, 0, total_rows)
+            timings['周统计明细'] = step.seconds
+            with attendance_profiler.phase('个人汇总表', len(summary_df)) as step:
+                write_sheet(workbook, '个人汇总', summary_df, progress, done, total_rows)
+            timings['个人汇总表'] = step.seconds
+
+            # 添加规则说明
+            sheet = workbook.create_sheet('考勤规则')
+            for row in rules_sheet_rows(group_rules if group_rules is not None else default_group_rules()):
+                sheet.append(row)
+
+            with attendance_profiler.phase('保存文件') as step:
+                workbook.save(file_path)
+            timings['保存文件'] = step.seconds
+    if progress is not None:
+        progress(total_rows, total_rows)
+
+    log("导出耗时: " + " | ".join(f"{phase} {seconds:.2f}秒" for phase, seconds in timings.items()))
+    return file_path
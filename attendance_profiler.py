@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能记录
+记录加载、统计、导出各阶段及其子步骤的耗时、处理行数和进程内存峰值，可导出为 JSON；
+需要函数级的耗时时可用 cProfile 采集
+"""
+
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# 阶段进行中采样内存的间隔（秒）
+SAMPLE_INTERVAL = 0.02
+
+# 最多保留的阶段记录数，超过时丢弃最早的
+MAX_RECORDS = 5000
+
+
+def _windows_memory_reader():
+    """Windows 下读取当前进程工作集大小的函数"""
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    kernel32 = ctypes.WinDLL('kernel32')
+    psapi = ctypes.WinDLL('psapi')
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+    psapi.GetProcessMemoryInfo.restype = wintypes.BOOL
+    process = kernel32.GetCurrentProcess()
+
+    def read():
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if not psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize
+
+    return read
+
+
+def _proc_memory_reader():
+    """Linux 下从 /proc/self/statm 读取常驻内存大小的函数"""
+    page_size = os.sysconf('SC_PAGE_SIZE')
+
+    def read():
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * page_size
+
+    return read
+
+
+def _memory_reader():
+    try:
+        if sys.platform == 'win32':
+            return _windows_memory_reader()
+        if os.path.exists('/proc/self/statm'):
+            return _proc_memory_reader()
+    except (OSError, AttributeError, ValueError):
+        pass
+    return lambda: None
+
+
+# 读取当前进程内存占用（字节），不支持的平台返回 None
+memory_rss = _memory_reader()
+
+
+class PhaseRecord:
+    """一个阶段（或子步骤）的一次执行"""
+
+    def __init__(self, name, parent=None, rows=None):
+        self.name = name
+        self.parent = parent
+        self.rows = rows  # 处理的行数，未知时为 None
+        self.started = time.time()
+        self.seconds = 0.0
+        self.peak_bytes = None  # 阶段内采样到的进程内存峰值
+
+    def observe(self, rss):
+        if rss is not None and (self.peak_bytes is None or rss > self.peak_bytes):
+            self.peak_bytes = rss
+
+
+class Profiler:
+    """
+    阶段计时器
+
+    phase() 可嵌套使用，同一线程内的内层阶段记为外层的子步骤；阶段进行中由后台线程按 sample_interval
+    采样进程内存，记录峰值。profile_enabled 为 True 时，调用方可用 capture() 对任务做 cProfile 采集。
+    """
+
+    def __init__(self, sample_interval=SAMPLE_INTERVAL, max_records=MAX_RECORDS):
+        self.sample_interval = sample_interval
+        self.max_records = max_records
+        self.records = []
+        self.active = set()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.sampler = None
+        self.profile_enabled = False
+
+    @contextmanager
+    def phase(self, name, rows=None):
+        """记录一个阶段，返回的记录可在阶段内补上 rows"""
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        record = PhaseRecord(name, stack[-1] if stack else None, rows)
+        record.observe(memory_rss())
+        with self.lock:
+            self.records.append(record)
+            if len(self.records) > self.max_records:
+                del self.records[:len(self.records) - self.max_records]
+            self.active.add(record)
+            if self.sampler is None:
+                self.sampler = threading.Thread(target=self.sample, daemon=True)
+                self.sampler.start()
+
+        stack.append(record)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - started
+            stack.pop()
+            record.observe(memory_rss())
+            with self.lock:
+                self.active.discard(record)
+
+    def sample(self):
+        """采样线程：有进行中的阶段时定时读取内存"""
+        while True:
+            with self.lock:
+                if not self.active:
+                    self.sampler = None
+                    return
+                active = list(self.active)
+            rss = memory_rss()
+            for record in active:
+                record.observe(rss)
+            time.sleep(self.sample_interval)
+
+    def clear(self):
+        with self.lock:
+            self.records = [record for record in self.records if record in self.active]
+
+    def summary(self):
+        """
+        按阶段汇总
+
+        每个顶层阶段单独列出；同一阶段下同名的子步骤（例如分块统计的每一块）合并为一项，
+        次数、耗时和行数累加，内存峰值取最大值。
+        """
+        with self.lock:
+            records = [record for record in self.records if record not in self.active]
+
+        nodes = {}  # 记录 -> 所在的汇总项
+        roots = []
+        for record in records:
+            parent = nodes.get(record.parent)
+            siblings = roots if parent is None else parent['children']
+            node = None
+            if parent is not None:
+                node = next((item for item in siblings if item['name'] == record.name), None)
+            if node is None:
+                node = {'name': record.name,
+                        'started': datetime.fromtimestamp(record.started).isoformat(timespec='seconds'),
+                        'calls': 0, 'seconds': 0.0, 'rows': None, 'peak_mb': None, 'children': []}
+                siblings.append(node)
+            node['calls'] += 1
+            node['seconds'] += record.seconds
+            if record.rows is not None:
+                node['rows'] = (node['rows'] or 0) + int(record.rows)
+            if record.peak_bytes is not None:
+                node['peak_mb'] = max(node['peak_mb'] or 0.0, record.peak_bytes / 1024 / 1024)
+            nodes[record] = node
+
+        def finish(node):
+            node['rows_per_second'] = (node['rows'] / node['seconds']
+                                       if node['rows'] is not None and node['seconds'] > 0 else None)
+            for child in node['children']:
+                finish(child)
+            return node
+
+        return [finish(node) for node in roots]
+
+    def save_json(self, file_path):
+        """把汇总和运行环境保存为 JSON"""
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'phases': self.summary(),
+        }
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return file_path
+
+    @contextmanager
+    def capture(self, file_path):
+        """
+        用 cProfile 采集当前线程中这段代码的函数级耗时
+
+        profile_enabled 为 False 时不做任何事。结束后把结果保存到 file_path（可用 pstats / snakeviz 查看），
+        返回的字典在结束后包含 'path' 和按累计耗时排序的前几项文本 'top'。
+        """
+        outcome = {}
+        if not self.profile_enabled:
+            yield outcome
+            return
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield outcome
+        finally:
+            profile.disable()
+            os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+            profile.dump_stats(file_path)
+            stream = io.StringIO()
+            pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(15)
+            outcome.update(path=file_path, top=stream.getvalue())
+
+
+# 进程内共用的计时器，统计引擎和界面都记录到这里
+PROFILER = Profiler()
+
+
+def phase(name, rows=None):
+    """在 PROFILER 中记录一个阶段"""
+    return PROFILER.phase(name, rows)
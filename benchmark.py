@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+考勤统计性能基准
+生成与考勤导出文件格式一致的模拟工作簿，按界面和命令行实际执行的路径分别计时 加载、统计 和 导出，
+并记录各阶段的子步骤（读取工作簿、日期解析、打卡分类、按周汇总 等），结果保存为 JSON，
+便于比较不同版本的性能变化
+
+用法:
+    python benchmark.py --rows 1000 10000 100000 1000000 -o benchmark.json
+    python benchmark.py --rows 100000 --layout 教师组 --compare benchmark.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import attendance_engine
+import attendance_profiler
+
+
+# 模拟导出文件的版式：行政组格式包含行政组/后勤组员工，教师组格式只有教师组员工
+LAYOUTS = {
+    '行政组': {'columns': attendance_engine.ADMIN_COLUMNS, 'groups': ['行政组', '后勤组']},
+    '教师组': {'columns': attendance_engine.TEACHER_COLUMNS, 'groups': ['教师组']},
+}
+
+DEFAULT_ROWS = [1000, 10000, 100000, 1000000]
+DEFAULT_START = '2025-09-01'
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), 'attendance_benchmark')
+
+PHASES = ['加载', '统计', '导出']
+
+WEEKDAY_NAMES = ['星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']
+DEPARTMENTS = ['语文', '数学', '英语', '物理', '化学', '办公室', '教务处', '后勤处']
+
+# 异常打卡结果及其权重
+ANOMALIES = ['缺卡', '迟到', '严重迟到', '补卡', '请假', '管理员改为正常']
+ANOMALY_WEIGHTS = [0.35, 0.2, 0.2, 0.1, 0.1, 0.05]
+
+
+def log(message):
+    """写入进度信息（标准错误输出）"""
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}", file=sys.stderr)
+
+
+def punch_times(layout, rows, late, rng):
+    """生成各次打卡时间，迟到/早退的打卡偏离时限"""
+    group = LAYOUTS[layout]['groups'][0]
+    limits = attendance_engine.default_group_rules()[group]['punch_times']
+    times = []
+    for j, limit in enumerate(limits):
+        minutes = attendance_engine.parse_time_of_day(limit)
+        start = j % 2 == 0
+        offset = rng.integers(1, 30, rows)
+        punctual = minutes - offset if start else minutes + offset
+        deviated = minutes + offset if start else minutes - offset
+        values = np.where(late[:, j], deviated, punctual)
+        times.append(np.char.add(np.char.zfill((values // 60).astype(str), 2),
+                                 np.char.add(':', np.char.zfill((values % 60).astype(str), 2))))
+    return times
+
+
+def generate_workbook(file_path, staff, weeks, layout='行政组', anomaly_rate=0.1, seed=0, start=DEFAULT_START):
+    """
+    生成模拟考勤导出文件
+
+    前两行为标题，第三行为表头，之后每人每天一行（包括周末），日期为 "YY-MM-DD 星期X" 格式。
+    每次打卡以 anomaly_rate 的概率出现缺卡、迟到、补卡等异常。返回数据行数。
+    """
+    from openpyxl import Workbook
+
+    rng = np.random.default_rng(seed)
+    punch_columns = LAYOUTS[layout]['columns']
+    punches = len(punch_columns) // 2
+    days = [datetime.strptime(start, '%Y-%m-%d') + timedelta(days=i) for i in range(weeks * 7)]
+    rows = staff * len(days)
+
+    # 每人一组固定信息，按 日期 × 员工 展开
+    person = np.tile(np.arange(staff), len(days))
+    day = np.repeat(np.arange(len(days)), staff)
+    groups = np.array(LAYOUTS[layout]['groups'], dtype=object)[rng.integers(0, len(LAYOUTS[layout]['groups']), staff)]
+    departments = np.array(DEPARTMENTS, dtype=object)[rng.integers(0, len(DEPARTMENTS), staff)]
+    date_labels = np.array([f"{d:%y-%m-%d} {WEEKDAY_NAMES[d.weekday()]}" for d in days], dtype=object)
+    work_dates = np.array([f"{d:%Y-%m-%d}" for d in days], dtype=object)
+    weekend = np.array([d.weekday() >= 5 for d in days])[day]
+
+    # 打卡结果和打卡时间
+    anomalous = rng.random((rows, punches)) < anomaly_rate
+    kinds = rng.choice(len(ANOMALIES), size=(rows, punches), p=ANOMALY_WEIGHTS)
+    results = np.where(anomalous, np.array(ANOMALIES, dtype=object)[kinds], '正常')
+    late = anomalous & np.isin(kinds, [ANOMALIES.index('迟到'), ANOMALIES.index('严重迟到')])
+    times = punch_times(layout, rows, late, rng)
+    missing = anomalous & (kinds == ANOMALIES.index('缺卡'))
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('考勤报表')
+    sheet.append(['考勤报表'])
+    sheet.append([f"统计日期: {days[0]:%Y-%m-%d} 至 {days[-1]:%Y-%m-%d}"])
+    sheet.append(attendance_engine.BASE_COLUMNS + punch_columns)
+    for i in range(rows):
+        p = person[i]
+        row = [f"员工{p}", groups[p], departments[p], departments[p], 10000 + int(p), '教师', f"user{p}",
+               date_labels[day[i]], work_dates[day[i]], '' if weekend[i] else '正常班次']
+        for j in range(punches):
+            if weekend[i]:
+                row += [None, None]
+            elif missing[i, j]:
+                row += [None, '缺卡']
+            else:
+                row += [times[j][i], results[i, j]]
+        sheet.append(row)
+    workbook.save(file_path)
+    return rows
+
+
+def workbook_path(workdir, rows, weeks, layout, anomaly_rate, seed):
+    """按生成参数命名的模拟文件路径，参数相同时复用已生成的文件"""
+    name = f"考勤_{layout}_{rows}行_{weeks}周_{anomaly_rate:g}_{seed}.xlsx"
+    return os.path.join(workdir, name)
+
+
+def run_once(file_path, group, export_path):
+    """
+    按界面“开始统计”和命令行的路径处理一个文件
+
+    加载用 load_attendance_file（不使用缓存），统计用 IncrementalAnalysis，导出用 write_results。
+    返回 (各阶段耗时, 各子步骤耗时, 记录数)，子步骤取自 attendance_profiler 的阶段记录，键为 "阶段/子步骤"。
+    """
+    rules = attendance_engine.default_group_rules()
+    profiler = attendance_profiler.PROFILER
+    profiler.clear()
+    timings = {}
+
+    with attendance_profiler.phase('加载') as step:
+        df = attendance_engine.load_attendance_file(file_path, cache=None, group_rules=rules)
+    timings['加载'] = step.seconds
+    with attendance_profiler.phase('统计') as step:
+        analysis = attendance_engine.IncrementalAnalysis(df, rules, group)
+    timings['统计'] = step.seconds
+    results = attendance_engine.WeeklyResults(analysis.weekly, group)
+    with attendance_profiler.phase('导出') as step:
+        attendance_engine.write_results(results, export_path, group_rules=rules)
+    timings['导出'] = step.seconds
+
+    steps = {f"{node['name']}/{child['name']}": child['seconds']
+             for node in profiler.summary() for child in node['children']}
+    return timings, steps, len(df)
+
+
+def git_revision():
+    """当前代码的 git 版本，不在 git 仓库中时返回 None"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """与之前保存的结果比较，打印各阶段耗时的变化"""
+    previous = {(run['rows'], run['layout']): run for run in baseline['runs']}
+    print(f"\n与 {baseline.get('revision') or '基准'} ({baseline.get('created', '')}) 比较:")
+    for run in report['runs']:
+        old = previous.get((run['rows'], run['layout']))
+        if old is None:
+            continue
+        changes = []
+        for phase in PHASES:
+            if phase in run['phases'] and phase in old['phases'] and old['phases'][phase] > 0:
+                ratio = run['phases'][phase] / old['phases'][phase]
+                changes.append(f"{phase} {ratio:.2f}x")
+        print(f"  {run['rows']:>8} 行: " + " | ".join(changes))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="考勤统计性能基准")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help="各次测试的数据行数（默认: 1000 10000 100000 1000000）")
+    parser.add_argument('--weeks', type=int, default=4, help="模拟的周数，员工数 = 行数 / (周数 × 7)（默认: 4）")
+    parser.add_argument('--layout', choices=list(LAYOUTS), default='行政组', help="导出文件格式（默认: 行政组）")
+    parser.add_argument('--anomaly-rate', type=float, default=0.1, help="每次打卡出现异常的概率（默认: 0.1）")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子（默认: 0）")
+    parser.add_argument('--repeat', type=int, default=1, help="每个规模重复次数，取各阶段最短耗时（默认: 1）")
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR, help="模拟文件和导出文件的目录")
+    parser.add_argument('-o', '--output', help="结果 JSON 路径（默认: benchmark_<时间>.json）")
+    parser.add_argument('--compare', metavar='JSON', help="与之前保存的结果比较")
+    args = parser.parse_args(argv)
+    if not args.output:
+        args.output = f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.workdir, exist_ok=True)
+    group = attendance_engine.ALL_GROUPS
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'runs': [],
+    }
+
+    for rows in args.rows:
+        staff = max(1, -(-rows // (args.weeks * 7)))
+        file_path = workbook_path(args.workdir, rows, args.weeks, args.layout, args.anomaly_rate, args.seed)
+        if not os.path.exists(file_path):
+            log(f"生成模拟文件: {staff} 人 × {args.weeks} 周")
+            started = time.perf_counter()
+            generate_workbook(file_path, staff, args.weeks, args.layout, args.anomaly_rate, args.seed)
+            log(f"生成完成（{time.perf_counter() - started:.1f}秒）")
+
+        best = {}
+        best_steps = {}
+        for _ in range(args.repeat):
+            timings, steps, records = run_once(file_path, group, os.path.join(args.workdir, 'benchmark_export.xlsx'))
+            for phase, seconds in timings.items():
+                best[phase] = min(seconds, best.get(phase, seconds))
+            for name, seconds in steps.items():
+                best_steps[name] = min(seconds, best_steps.get(name, seconds))
+
+        run = {'rows': staff * args.weeks * 7, 'staff': staff, 'weeks': args.weeks, 'layout': args.layout,
+               'records': records, 'phases': best, 'steps': best_steps, 'total': sum(best.values())}
+        report['runs'].append(run)
+        log(f"{run['rows']:>8} 行: " + " | ".join(f"{phase} {best[phase]:.2f}秒" for phase in PHASES)
+            + f" | 合计 {run['total']:.2f}秒")
+        log("  子步骤: " + " | ".join(f"{name} {seconds:.2f}秒" for name, seconds in best_steps.items()))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    log(f"结果已保存到: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
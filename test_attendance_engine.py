@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统计结果一致性测试
+用 benchmark.generate_workbook 生成模拟导出文件，把 analyze()、IncrementalAnalysis（构建、
+修改特殊休息日、追加记录）和个人汇总的结果与原来逐行循环（iterrows）的统计逻辑逐行比较
+
+运行: python -m pytest -q test_attendance_engine.py
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import attendance_config
+import attendance_engine
+import benchmark
+
+
+HOLIDAYS = {'2025-09-03', '2025-09-10'}
+CHANGED_HOLIDAYS = {'2025-09-10', '2025-09-16'}
+
+
+# ---- 原逐行统计逻辑（AttendanceChecker.start_analysis 及其辅助方法） ----
+
+def legacy_parse_date(date_str):
+    if pd.isna(date_str):
+        return None
+    date_str = str(date_str).strip()
+    if '星期' in date_str:
+        parts = date_str.split()[0].split('-')
+        if len(parts) == 3:
+            year = '20' + parts[0] if len(parts[0]) == 2 else parts[0]
+            return f"{year}-{parts[1].zfill(2)}-{parts[2].zfill(2)}"
+    for fmt in ['%Y-%m-%d', '%y-%m-%d', '%Y/%m/%d', '%y/%m/%d']:
+        try:
+            return datetime.strptime(date_str.split()[0], fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+def legacy_week_key(date_str):
+    dt = datetime.strptime(date_str, '%Y-%m-%d')
+    monday = dt - timedelta(days=dt.weekday())
+    return f"{monday:%Y-%m-%d} 至 {monday + timedelta(days=4):%Y-%m-%d}"
+
+
+def legacy_group(row, group_rules, current_group):
+    if pd.notna(row.get('考勤组')):
+        group = str(row['考勤组']).strip()
+        for known_group in group_rules:
+            if known_group in group:
+                return known_group
+    return current_group
+
+
+def legacy_punch_status(status):
+    if pd.isna(status) or status == '' or status == '未打卡':
+        return '缺卡'
+    status = str(status).strip().lower()
+    if '正常' in status or ('管理员' in status and '改为正常' in status):
+        return '正常'
+    for name in ('补卡', '请假', '严重迟到', '缺卡'):
+        if name in status:
+            return name
+    return status
+
+
+def legacy_day(row, date_str, rule, group, holidays):
+    """一条记录的 (打卡次数, 正常次数, 迟到次数, 旷工次数)"""
+    if date_str in holidays or datetime.strptime(date_str, '%Y-%m-%d').weekday() >= 5:
+        return rule['daily_punches'], rule['daily_punches'], 0, 0
+
+    if group == '教师组':
+        columns = ['上班1打卡结果', '下班1打卡结果']
+    else:
+        columns = ['上班1打卡结果', '下班1打卡结果', '上班2打卡结果', '下班2打卡结果']
+    punches = [legacy_punch_status(row.get(col, '')) for col in columns]
+
+    normal = sum(punch in ('正常', '补卡', '请假') for punch in punches)
+    absent = int('缺卡' in punches[:2]) + int('缺卡' in punches[2:])
+    late = 0
+    if '缺卡' not in punches and '严重迟到' in punches and '正常' in punches:
+        late = 1
+        normal += 1
+    return len(punches), normal, late, absent
+
+
+def legacy_week_result(stats, expected):
+    if stats['total'] < expected:
+        stats['normal'] += expected - stats['total']
+        stats['total'] = expected
+    if stats['normal'] >= expected:
+        return "正常"
+    if stats['absent'] > 0:
+        return f"旷工{stats['absent']}次"
+    if stats['late'] > 0:
+        return f"迟到{stats['late']}次"
+    return f"异常{expected - stats['normal']}次"
+
+
+def legacy_weekly(raw, group_rules, current_group, holidays=()):
+    """原 start_analysis 的逐行统计，返回 WEEKLY_COLUMNS 列的 DataFrame"""
+    weekly_stats = defaultdict(lambda: defaultdict(lambda: {
+        'total': 0, 'normal': 0, 'late': 0, 'absent': 0, 'department': '', 'group': ''}))
+    for _, row in raw.iterrows():
+        name = row.get('姓名', '')
+        date_str = legacy_parse_date(row.get('日期', ''))
+        if not date_str or pd.isna(name) or name == '姓名':
+            continue
+        group = legacy_group(row, group_rules, current_group)
+        if group != current_group:
+            continue
+
+        stats = weekly_stats[name][legacy_week_key(date_str)]
+        stats['department'] = row.get('部门', '')
+        stats['group'] = group
+        total, normal, late, absent = legacy_day(row, date_str, group_rules[group], group, set(holidays))
+        stats['total'] += total
+        stats['normal'] += normal
+        stats['late'] += late
+        stats['absent'] += absent
+
+    rows = []
+    for name, weeks in weekly_stats.items():
+        for week_key, stats in weeks.items():
+            expected = group_rules[stats['group']]['weekly_punches']
+            result = legacy_week_result(stats, expected)
+            rows.append([name, stats['department'], stats['group'], week_key, expected, stats['total'],
+                         stats['normal'], stats['late'], stats['absent'], result])
+    return pd.DataFrame(rows, columns=attendance_engine.WEEKLY_COLUMNS)
+
+
+def legacy_summary(result_df):
+    """原 export_results 的个人汇总"""
+    rows = []
+    for name in result_df['姓名'].unique():
+        person = result_df[result_df['姓名'] == name]
+        total_weeks = len(person)
+        normal_weeks = sum(person['周结果'] == '正常')
+        rows.append({
+            '姓名': name,
+            '部门': person['部门'].iloc[0],
+            '考勤组': person['考勤组'].iloc[0],
+            '统计周数': total_weeks,
+            '正常周数': normal_weeks,
+            '迟到周数': sum(person['周结果'].str.contains('迟到', na=False)),
+            '旷工周数': sum(person['周结果'].str.contains('旷工', na=False)),
+            '正常率': f"{normal_weeks / total_weeks * 100:.1f}%",
+        })
+    return pd.DataFrame(rows, columns=attendance_engine.SUMMARY_COLUMNS)
+
+
+# ---- 测试 ----
+
+def rows(frame, columns):
+    """按行转为 Python 值的元组，便于逐行比较"""
+    return [tuple(None if pd.isna(value) else (value.item() if hasattr(value, 'item') else value)
+                  for value in row)
+            for row in frame[columns].itertuples(index=False)]
+
+
+def assert_same_weekly(weekly, expected):
+    assert rows(weekly, attendance_engine.WEEKLY_COLUMNS) == rows(expected, attendance_engine.WEEKLY_COLUMNS)
+
+
+@pytest.fixture(scope='module', params=list(benchmark.LAYOUTS))
+def workbook_file(request, tmp_path_factory):
+    """(模拟导出文件路径, 版式)"""
+    layout = request.param
+    file_path = tmp_path_factory.mktemp('workbook') / f"考勤_{layout}.xlsx"
+    benchmark.generate_workbook(str(file_path), staff=20, weeks=3, layout=layout, anomaly_rate=0.7, seed=7)
+    return file_path, layout
+
+
+@pytest.fixture(scope='module')
+def workbook(workbook_file):
+    """(原始表, 加载后的 DataFrame, 考勤组规则, 该版式的考勤组)"""
+    file_path, layout = workbook_file
+    group_rules = attendance_engine.default_group_rules()
+    raw = pd.read_excel(file_path, skiprows=attendance_engine.HEADER_SKIP_ROWS, engine='openpyxl')
+    attendance_engine.standardize_columns(raw)
+    df = attendance_engine.load_attendance_file(str(file_path), cache=None, group_rules=group_rules)
+    return raw, df, group_rules, benchmark.LAYOUTS[layout]['groups']
+
+
+def test_analyze_matches_legacy(workbook):
+    raw, df, group_rules, groups = workbook
+    for group in groups:
+        for holidays in (set(), HOLIDAYS):
+            weekly = attendance_engine.analyze(df, group_rules, group, holidays, chunk_rows=50)
+            assert_same_weekly(weekly, legacy_weekly(raw, group_rules, group, holidays))
+
+
+def test_incremental_build_and_update_match_legacy(workbook):
+    raw, df, group_rules, groups = workbook
+    for group in groups:
+        analysis = attendance_engine.IncrementalAnalysis(df, group_rules, group, HOLIDAYS)
+        assert_same_weekly(analysis.weekly, legacy_weekly(raw, group_rules, group, HOLIDAYS))
+
+        analysis.update(CHANGED_HOLIDAYS)
+        assert_same_weekly(analysis.weekly, legacy_weekly(raw, group_rules, group, CHANGED_HOLIDAYS))
+
+        analysis.update(set())
+        assert_same_weekly(analysis.weekly, legacy_weekly(raw, group_rules, group))
+
+
+def test_incremental_append_matches_legacy(workbook):
+    raw, df, group_rules, groups = workbook
+    # 按日期分两批导入，第二批与第一批有重叠的日期
+    dates = df[attendance_engine.DATE_COLUMN]
+    split = dates.min() + pd.Timedelta(days=9)
+    first = df[dates < split]
+    second = df[dates >= split - pd.Timedelta(days=2)]
+    overlap = int((dates >= split - pd.Timedelta(days=2)).sum() - (dates >= split).sum())
+
+    for group in groups:
+        analysis = attendance_engine.IncrementalAnalysis(first, group_rules, group, HOLIDAYS)
+        added, skipped = analysis.append(second)
+        assert skipped == overlap
+        assert_same_weekly(analysis.weekly, legacy_weekly(raw, group_rules, group, HOLIDAYS))
+
+
+def test_repeated_rows_counted_like_legacy(workbook):
+    raw, df, group_rules, groups = workbook
+    # 同一导出中重复的 (UserId, 日期) 记录与原逻辑一样全部统计
+    repeated = list(range(0, len(df), 7))
+    raw_repeated = pd.concat([raw, raw.iloc[repeated]], ignore_index=True)
+    df_repeated = pd.concat([df, df.iloc[repeated]], ignore_index=True)
+    for group in groups:
+        expected = legacy_weekly(raw_repeated, group_rules, group, HOLIDAYS)
+        assert_same_weekly(attendance_engine.analyze(df_repeated, group_rules, group, HOLIDAYS), expected)
+        analysis = attendance_engine.IncrementalAnalysis(df_repeated, group_rules, group, HOLIDAYS)
+        assert_same_weekly(analysis.weekly, expected)
+
+
+def test_person_summary_matches_legacy(workbook):
+    raw, df, group_rules, groups = workbook
+    for group in groups:
+        analysis = attendance_engine.IncrementalAnalysis(df, group_rules, group, HOLIDAYS)
+        summary = attendance_engine.WeeklyResults(analysis.weekly, group).person_summary()
+        expected = legacy_summary(legacy_weekly(raw, group_rules, group, HOLIDAYS))
+        assert rows(summary, attendance_engine.SUMMARY_COLUMNS) == rows(expected, attendance_engine.SUMMARY_COLUMNS)
+
+
+def test_read_workbook_matches_read_excel(workbook_file):
+    file_path, _ = workbook_file
+    expected = pd.read_excel(file_path, skiprows=attendance_engine.HEADER_SKIP_ROWS, engine='openpyxl')
+    attendance_engine.standardize_columns(expected)
+    df = attendance_engine.read_workbook(str(file_path), chunk_rows=50)
+    attendance_engine.standardize_columns(df)
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_compact_workbook_matches_full_read(workbook_file):
+    file_path, _ = workbook_file
+    # 分块精简的结果与读取完整表格后再精简的结果相同
+    expected = attendance_engine.read_workbook(str(file_path))
+    attendance_engine.standardize_columns(expected)
+    attendance_engine.normalize_dates(expected)
+    expected = attendance_engine.compact_frame(expected)
+    df = attendance_engine.read_compact_workbook(str(file_path), chunk_rows=50)
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_drop_duplicate_punches_between_files(workbook):
+    raw, df, group_rules, groups = workbook
+    # 第二个文件与第一个文件重叠，且 UserId 为字符串；第一个文件内部有重复记录
+    repeated = list(range(0, len(df), 7))
+    first = pd.concat([df, df.iloc[repeated]], ignore_index=True)
+    second = df.iloc[:30].copy()
+    second['UserId'] = second['UserId'].astype(str)
+    merged, removed = attendance_engine.drop_duplicate_punches([first, second])
+
+    overlap = set(zip(second['UserId'], second[attendance_engine.DATE_COLUMN]))
+    in_second = [(str(user), date) in overlap
+                 for user, date in zip(first['UserId'], first[attendance_engine.DATE_COLUMN])]
+    assert removed == sum(in_second)
+    assert len(merged) == len(first) + len(second) - removed
+    # 文件内的重复记录保留
+    _, removed = attendance_engine.drop_duplicate_punches([first])
+    assert removed == 0
+
+
+def test_time_mode_late_minutes_and_statuses():
+    # 行政组时限 08:00 前、11:20 后、13:40 前、16:30 后
+    group_rules = attendance_engine.default_group_rules()
+    punches = [
+        ['08:10', '正常', '11:30', '正常', '13:30', '正常', '16:40', '正常'],  # 迟到 10 分钟
+        ['07:50', '正常', '11:00', '正常', '13:40', '正常', '', '正常'],  # 早退 20 分钟，下午缺卡
+        ['', '请假', '11:25', '正常', '13:35', '正常', '15:00', '补卡'],  # 请假和补卡沿用打卡结果
+    ]
+    dates = ['25-09-01 星期一', '25-09-02 星期二', '25-09-03 星期三']
+    df = pd.DataFrame([['张三', '行政组', '财务', 1001, date] + row for date, row in zip(dates, punches)],
+                      columns=['姓名', '考勤组', '部门', 'UserId', '日期'] + attendance_engine.ADMIN_COLUMNS)
+    attendance_engine.normalize_dates(df)
+    df = attendance_engine.compact_frame(df)
+
+    daily = attendance_engine.classify_daily(df, group_rules, '行政组',
+                                             punch_mode=attendance_engine.EVALUATE_BY_TIME)
+    columns = ['实际打卡', '正常次数', '迟到次数', '旷工次数', attendance_engine.LATE_MINUTES_COLUMN]
+    assert rows(daily, columns) == [(4, 4, 1, 0, 10), (4, 2, 0, 1, 20), (4, 4, 0, 0, 0)]
+
+    weekly = attendance_engine.analyze(df, group_rules, '行政组', punch_mode=attendance_engine.EVALUATE_BY_TIME)
+    columns = ['应打卡', '实际打卡', '正常次数', '迟到次数', '旷工次数', '周结果', attendance_engine.LATE_MINUTES_COLUMN]
+    assert rows(weekly, columns) == [(20, 20, 18, 1, 1, '旷工1次', 30)]
+
+
+@pytest.mark.parametrize('changes', [
+    # 打卡时间列与打卡结果列不对应
+    {'punch_columns': ['上班1打卡时间', '上班1打卡结果', '下班1打卡结果', '上班2打卡结果'], 'punch_times': ['08:00']},
+    {'punch_columns': ['下班1打卡时间', '上班1打卡结果', '上班1打卡时间', '下班1打卡结果'],
+     'daily_punches': 2, 'punch_times': ['08:00', '16:30']},
+    # daily_punches 与打卡结果列数不一致
+    {'daily_punches': 3},
+])
+def test_check_rule_rejects_mismatched_columns(changes):
+    rule = dict(attendance_engine.default_group_rules()['行政组'], **changes)
+    rule.pop('evaluator')
+    with pytest.raises(ValueError):
+        attendance_config.check_rule('测试组', rule)
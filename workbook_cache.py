@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+考勤文件解析缓存
+以文件路径、大小、修改时间和内容哈希为键，把标准化后的 DataFrame 保存到磁盘，
+同一文件再次打开时直接读取缓存
+"""
+
+import os
+import hashlib
+
+
+# 缓存格式版本，读取逻辑变化时递增以废弃旧缓存
+CACHE_VERSION = 2
+
+# 默认缓存目录和容量上限
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('LOCALAPPDATA') or os.path.expanduser('~'),
+                                 '.attendance_checker', 'cache')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+CACHE_SUFFIX = '.pkl'
+
+
+def file_hash(file_path, block_size=1024 * 1024):
+    """计算文件内容哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class WorkbookCache:
+    """
+    已解析工作簿的磁盘缓存
+
+    缓存文件为 pickle 格式的 DataFrame，总大小超过 max_bytes 时按最近使用时间淘汰。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def key(self, file_path):
+        """由文件路径、大小、修改时间和内容哈希生成缓存键"""
+        stat = os.stat(file_path)
+        identity = '|'.join([
+            str(CACHE_VERSION),
+            os.path.abspath(file_path),
+            str(stat.st_size),
+            str(stat.st_mtime_ns),
+            file_hash(file_path),
+        ])
+        return hashlib.blake2b(identity.encode('utf-8'), digest_size=16).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def load(self, key):
+        """读取缓存，未命中或缓存损坏时返回 None"""
+        cache_path = self.path(key)
+        if not os.path.exists(cache_path):
+            return None
+        # 界面启动时不导入 pandas，读取缓存时才需要
+        import pandas as pd
+
+        try:
+            df = pd.read_pickle(cache_path)
+        except Exception:
+            self.remove(cache_path)
+            return None
+
+        # 更新修改时间作为最近使用时间
+        os.utime(cache_path)
+        return df
+
+    def store(self, key, df):
+        """写入缓存并按容量上限淘汰旧缓存"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_path = self.path(key)
+        temp_path = cache_path + '.tmp'
+        df.to_pickle(temp_path)
+        os.replace(temp_path, cache_path)
+        self.evict()
+
+    def entries(self):
+        """列出缓存文件 (路径, 大小, 最近使用时间)"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(CACHE_SUFFIX):
+                cache_path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(cache_path)
+                except OSError:
+                    continue
+                entries.append((cache_path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def size(self):
+        """缓存占用的总字节数"""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """总大小超过上限时，从最久未使用的缓存开始删除"""
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for cache_path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(cache_path)
+            total -= size
+
+    def clear(self):
+        """清空缓存，返回释放的字节数"""
+        freed = 0
+        for cache_path, size, _ in self.entries():
+            self.remove(cache_path)
+            freed += size
+        return freed
+
+    @staticmethod
+    def remove(cache_path):
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass